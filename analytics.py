@@ -0,0 +1,263 @@
+import csv
+import glob
+import os
+from itertools import islice
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+
+class StreamingStats:
+    """
+    Exact count/min/max/mean/std of a stream of values, updated one chunk at
+    a time (chunk moments are combined with Chan's parallel formula).
+    NaN values are ignored.
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = float("inf")
+        self._max = float("-inf")
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+
+        count = values.size
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+
+        total = self._count + count
+        delta = mean - self._mean
+        self._mean += delta * count / total
+        self._m2 += m2 + delta**2 * self._count * count / total
+        self._count = total
+        self._min = min(self._min, float(values.min()))
+        self._max = max(self._max, float(values.max()))
+
+    def get_count(self) -> int:
+        return self._count
+
+    def get_min(self) -> float:
+        return self._min
+
+    def get_max(self) -> float:
+        return self._max
+
+    def get_mean(self) -> float:
+        return self._mean
+
+    def get_std(self) -> float:
+        """Population standard deviation, same as np.std."""
+        return (self._m2 / self._count) ** 0.5 if self._count else float("nan")
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles in bounded memory.
+    Each chunk is merged into the sorted centroids and the result is
+    compressed with the k1 scale function, keeping about compression / 2
+    centroids and higher accuracy near the tails.
+    """
+
+    def __init__(self, compression: int = 200):
+        self._compression = compression
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._min = float("inf")
+        self._max = float("-inf")
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+
+        self._min = min(self._min, float(values.min()))
+        self._max = max(self._max, float(values.max()))
+
+        means = np.concatenate((self._means, values))
+        weights = np.concatenate((self._weights, np.ones(values.size)))
+        order = np.argsort(means, kind="stable")
+        self._compress(means[order], weights[order])
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        total = weights.sum()
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        k = self._compression / (2 * np.pi) * np.arcsin(2 * q_mid - 1)
+        bucket = np.floor(k)
+
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+
+        self._means = merged_means
+        self._weights = merged_weights
+
+    def quantile(self, q: float) -> float:
+        if self._weights.size == 0:
+            return float("nan")
+        if self._weights.size == 1:
+            return float(self._means[0])
+
+        total = self._weights.sum()
+        centres = np.cumsum(self._weights) - self._weights / 2
+        positions = np.r_[0.0, centres, total]
+        values = np.r_[self._min, self._means, self._max]
+        return float(np.interp(q * total, positions, values))
+
+
+def _cache_filename(filepath: str, mtime_ns: int) -> str:
+    return f"{filepath}.{mtime_ns}.npy"
+
+
+def _read_csv_chunks(filepath: str, chunk_size: int) -> Iterator[np.ndarray]:
+    """Parse a numeric CSV into structured arrays of at most chunk_size rows."""
+    with open(filepath, "r", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        dtype = np.dtype([(name, np.float64) for name in header])
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            raw = np.array(rows, dtype=str)
+            raw[raw == ""] = "nan"
+            values = raw.astype(np.float64)
+
+            chunk = np.empty(len(rows), dtype=dtype)
+            for i, name in enumerate(header):
+                chunk[name] = values[:, i]
+            yield chunk
+
+
+def _write_cache(filepath: str, mtime_ns: int, raw_filename: str, dtype, rows: int):
+    """Turn the raw records written while parsing into a .npy sidecar file."""
+    cache_filename = _cache_filename(filepath, mtime_ns)
+    tmp_filename = cache_filename + ".tmp"
+    with open(tmp_filename, "wb") as out, open(raw_filename, "rb") as raw:
+        np.lib.format.write_array_header_1_0(
+            out,
+            {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (rows,),
+            },
+        )
+        while True:
+            block = raw.read(1 << 20)
+            if not block:
+                break
+            out.write(block)
+    os.replace(tmp_filename, cache_filename)
+
+    for stale in glob.glob(glob.escape(filepath) + ".*.npy"):
+        if stale != cache_filename:
+            os.remove(stale)
+
+
+def iter_columns(
+    filepath: str, chunk_size: int = 65536, use_cache: bool = True
+) -> Iterator[np.ndarray]:
+    """
+    Stream a simulation CSV as structured NumPy arrays (one field per column)
+    of at most chunk_size rows. Empty cells become NaN.
+
+    The first pass writes the parsed records to a sidecar '<file>.<mtime>.npy';
+    later passes memory-map it instead of parsing the CSV, as long as the
+    source file's mtime did not change.
+    """
+    mtime_ns = os.stat(filepath).st_mtime_ns
+    cache_filename = _cache_filename(filepath, mtime_ns)
+
+    if use_cache and os.path.exists(cache_filename):
+        records = np.load(cache_filename, mmap_mode="r")
+        for start in range(0, records.shape[0], chunk_size):
+            yield np.array(records[start : start + chunk_size])
+        return
+
+    if not use_cache:
+        yield from _read_csv_chunks(filepath, chunk_size)
+        return
+
+    raw_filename = cache_filename + ".raw"
+    rows = 0
+    dtype: Optional[np.dtype] = None
+    try:
+        with open(raw_filename, "wb") as raw:
+            for chunk in _read_csv_chunks(filepath, chunk_size):
+                dtype = chunk.dtype
+                rows += chunk.shape[0]
+                raw.write(chunk.tobytes())
+                yield chunk
+        if dtype is not None:
+            _write_cache(filepath, mtime_ns, raw_filename, dtype, rows)
+    finally:
+        if os.path.exists(raw_filename):
+            os.remove(raw_filename)
+
+
+class ColumnSummary:
+    """Exact moments and approximate quantiles of one derived column."""
+
+    def __init__(self, label: str, compression: int = 200):
+        self._label = label
+        self._stats = StreamingStats()
+        self._digest = TDigest(compression)
+
+    def update(self, values: np.ndarray) -> None:
+        self._stats.update(values)
+        self._digest.update(values)
+
+    def get_label(self) -> str:
+        return self._label
+
+    def get_stats(self) -> StreamingStats:
+        return self._stats
+
+    def quantile(self, q: float) -> float:
+        return self._digest.quantile(q)
+
+    def boxplot_stats(self) -> dict:
+        """Box plot description for matplotlib's Axes.bxp, without the raw data."""
+        q1, med, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        iqr = q3 - q1
+        return {
+            "label": self._label,
+            "med": med,
+            "q1": q1,
+            "q3": q3,
+            "whislo": max(self._stats.get_min(), q1 - 1.5 * iqr),
+            "whishi": min(self._stats.get_max(), q3 + 1.5 * iqr),
+            "fliers": [],
+        }
+
+
+def summarize_time_difference(
+    filepath: str, chunk_size: int = 65536, use_cache: bool = True
+) -> ColumnSummary:
+    """Summarize 'Postage Time' - 'Dispatch Time' of a simulation CSV."""
+    summary = ColumnSummary(filepath)
+    for chunk in iter_columns(filepath, chunk_size, use_cache):
+        summary.update(chunk["Postage Time"] - chunk["Dispatch Time"])
+    return summary
+
+
+def _is_delivery_log(filepath: str) -> bool:
+    """Whether the CSV's header has the columns summarize_time_difference uses."""
+    with open(filepath, newline="") as f:
+        header = next(csv.reader(f), [])
+    return {"Dispatch Time", "Postage Time"} <= set(header)
+
+
+def summarize_files(pattern: str = "*.csv", **kwargs) -> List[ColumnSummary]:
+    """Summarize every delivery log matching pattern; other CSVs are skipped."""
+    return [
+        summarize_time_difference(f, **kwargs)
+        for f in sorted(glob.glob(pattern))
+        if _is_delivery_log(f)
+    ]
@@ -0,0 +1,108 @@
+import csv
+from itertools import islice
+from typing import Generator, Iterator, Optional, Tuple
+
+import numpy as np
+from package import Package
+from simpy import Environment, Timeout
+
+
+def _read_csv_chunks(
+    filepath: str, chunk_size: int
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Read (time, station_id) columns of a CSV, with or without a header row."""
+    with open(filepath, "r", newline="") as file:
+        reader = csv.reader(file)
+        first = next(reader, None)
+        if first is None:
+            return
+        try:
+            pending = [(float(first[0]), int(first[1]))]
+        except ValueError:  # header row
+            pending = []
+        while True:
+            rows = pending + [
+                (float(row[0]), int(row[1])) for row in islice(reader, chunk_size)
+            ]
+            pending = []
+            if not rows:
+                break
+            records = np.array(rows, dtype=np.float64)
+            yield records[:, 0], records[:, 1].astype(np.int64)
+
+
+def _read_npy_chunks(
+    filepath: str, chunk_size: int
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Read a memory-mapped .npy trace, either a structured array with 'time'
+    and 'station_id' fields or an (n, 2) array of time, station id.
+    """
+    records = np.load(filepath, mmap_mode="r")
+    for start in range(0, records.shape[0], chunk_size):
+        chunk = records[start : start + chunk_size]
+        if chunk.dtype.names:
+            yield np.asarray(chunk["time"], dtype=np.float64), np.asarray(
+                chunk["station_id"], dtype=np.int64
+            )
+        else:
+            yield np.asarray(chunk[:, 0], dtype=np.float64), np.asarray(
+                chunk[:, 1], dtype=np.int64
+            )
+
+
+def read_order_trace(
+    filepath: str,
+    time_scale: float = 1.0,
+    sample: float = 1.0,
+    seed: Optional[int] = 0,
+    chunk_size: int = 65536,
+) -> Iterator[Tuple[float, int]]:
+    """
+    Lazily stream (time, station_id) orders from a recorded trace, a CSV
+    file or a .npy file, holding at most chunk_size records in memory.
+
+    Times are shifted so the first order happens at 0 and multiplied by
+    time_scale (e.g. 0.5 replays the trace twice as fast). With sample < 1
+    each order is kept with that probability.
+    """
+    if str(filepath).endswith(".npy"):
+        chunks = _read_npy_chunks(filepath, chunk_size)
+    else:
+        chunks = _read_csv_chunks(filepath, chunk_size)
+
+    rng = np.random.default_rng(seed)
+    start_time: Optional[float] = None
+    for times, station_ids in chunks:
+        if start_time is None and times.size:
+            start_time = float(times[0])
+        if sample < 1.0:
+            keep = rng.random(times.size) < sample
+            times, station_ids = times[keep], station_ids[keep]
+        times = (times - start_time) * time_scale
+        yield from zip(times.tolist(), station_ids.tolist())
+
+
+def replay_orders(
+    env: Environment,
+    sorting_office,
+    orders: Iterator[Tuple[float, int]],
+    first_package_id: int = 1,
+) -> Generator[Timeout, None, None]:
+    """
+    Process generator posting a package for each (time, station_id) order.
+    Orders are expected in time order; one that is earlier than the current
+    simulation time is posted immediately. Orders for unknown stations are
+    skipped.
+    """
+    stations = sorting_office._package_stations
+    package_id = first_package_id
+    for time, station_id in orders:
+        if time > env.now:
+            yield env.timeout(time - env.now)
+        if station_id not in stations:
+            continue
+        package = Package(package_id, station_id)
+        package._postage_time = env.now
+        sorting_office._add_package(package)
+        package_id += 1
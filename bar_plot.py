@@ -1,54 +1,31 @@
 import matplotlib.pyplot as plt
-from collections import defaultdict
-import csv
-import glob
-import numpy as np
+from analytics import summarize_files
 
 
-def load_simulation_csv(filepath: str):
-    csv_data = defaultdict(list)
-    with open(filepath, "r") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            for key, value in row.items():
-                csv_data[key].append(value)
-    return dict(csv_data)
+# Summarize all CSV files, streaming them in chunks (parsed columns are
+# cached next to each file, so re-plotting is fast)
+summaries = summarize_files("*.csv")
 
-
-# Get all CSV files
-csv_files = glob.glob("*.csv")
-
-time_differences = []
-labels = []
-
-for file in csv_files:
-    # Load data from CSV file
-
-    data = load_simulation_csv(file)
-
-    # Convert necessary columns to numeric
-    data["Dispatch Time"] = list(map(float, data["Dispatch Time"]))
-    data["Postage Time"] = list(map(float, data["Postage Time"]))
-
-    # Calculate difference between Postage Time and Dispatch Time
-    time_difference = [
-        p - d for p, d in zip(data["Postage Time"], data["Dispatch Time"])
-    ]
-    time_differences.append(time_difference)
+for summary in summaries:
+    stats = summary.get_stats()
     print(
-        f"name: {file} min {np.min(time_difference)}, max {np.max(time_difference)}, mean {np.mean(time_difference)}, std {np.std(time_difference)}"
+        f"name: {summary.get_label()} min {stats.get_min()}, max {stats.get_max()}, mean {stats.get_mean()}, std {stats.get_std()}, "
+        f"p50 {summary.quantile(0.5)}, p95 {summary.quantile(0.95)}, p99 {summary.quantile(0.99)}"
     )
-    labels.append(file)
 
 # Plot the box plot
-plt.figure(figsize=(10, 6))
-plt.boxplot(time_differences, labels=labels, patch_artist=True)
-plt.xlabel("CSV Files")
-plt.ylabel("Time Difference (Postage - Dispatch)")
-plt.title(
+fig, ax = plt.subplots(figsize=(10, 6))
+ax.bxp(
+    [summary.boxplot_stats() for summary in summaries],
+    showfliers=False,
+    patch_artist=True,
+)
+ax.set_xlabel("CSV Files")
+ax.set_ylabel("Time Difference (Postage - Dispatch)")
+ax.set_title(
     "Box Plot of Time Difference Between Postage and Dispatch Time for Multiple CSV Files"
 )
-plt.grid(axis="y", linestyle="--", alpha=0.7)
+ax.grid(axis="y", linestyle="--", alpha=0.7)
 
 # Show plot
 plt.show()
@@ -0,0 +1,107 @@
+import glob
+import hashlib
+import marshal
+import os
+
+import numpy as np
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
+
+
+def _cache_filename(filepath: str, digest: str) -> str:
+    return f"{filepath}.{digest}.marshal"
+
+
+def load_config_yaml(filepath: str, use_cache: bool = True) -> dict:
+    """
+    Load the YAML configuration file and return a dict.
+
+    Uses the libyaml based loader when available. The parsed config is
+    cached next to the file as '<file>.<hash>.marshal', keyed on the hash of
+    the file contents, so unchanged configs skip YAML parsing entirely.
+    marshal only rebuilds plain data, so unlike pickle a cache file planted
+    next to the config cannot run code; a cache that does not hold a dict
+    is ignored. When the cache cannot be written (e.g. a read-only
+    directory), the parsed config is returned all the same.
+    """
+    filepath = str(filepath)
+    with open(filepath, "rb") as f:
+        data = f.read()
+
+    if not use_cache:
+        return yaml.load(data, Loader=SafeLoader)
+
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    cache_filename = _cache_filename(filepath, digest)
+
+    if os.path.exists(cache_filename):
+        try:
+            with open(cache_filename, "rb") as f:
+                config = marshal.load(f)
+            if isinstance(config, dict):
+                return config
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    config = yaml.load(data, Loader=SafeLoader)
+
+    tmp_filename = cache_filename + ".tmp"
+    try:
+        with open(tmp_filename, "wb") as f:
+            marshal.dump(config, f)
+        os.replace(tmp_filename, cache_filename)
+
+        # Also drops the pickle caches written by earlier versions
+        for pattern in (".*.marshal", ".*.pickle"):
+            for stale in glob.glob(glob.escape(filepath) + pattern):
+                if stale != cache_filename:
+                    os.remove(stale)
+    except (OSError, ValueError):  # ValueError: a type marshal cannot store
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+
+    return config
+
+
+def load_config_npz(filepath: str) -> dict:
+    """Load a config written by generate_config in the NPZ format."""
+    with np.load(filepath) as arrays:
+        drones = [
+            {"id": drone_id, "velocity": velocity}
+            for drone_id, velocity in zip(
+                arrays["drone_id"].tolist(), arrays["drone_velocity"].tolist()
+            )
+        ]
+        stations = [
+            {"id": station_id, "position": [x, y], "lockers": lockers}
+            for station_id, x, y, lockers in zip(
+                arrays["station_id"].tolist(),
+                arrays["station_x"].tolist(),
+                arrays["station_y"].tolist(),
+                arrays["station_lockers"].tolist(),
+            )
+        ]
+        config = {"drones": drones, "package_stations": stations}
+        if "office_id" in arrays:
+            config["sorting_offices"] = [
+                {"id": office_id, "position": [x, y]}
+                for office_id, x, y in zip(
+                    arrays["office_id"].tolist(),
+                    arrays["office_x"].tolist(),
+                    arrays["office_y"].tolist(),
+                )
+            ]
+    return config
+
+
+def load_config(filepath: str) -> dict:
+    """Load a config file, YAML or NPZ depending on its extension."""
+    if str(filepath).endswith(".npz"):
+        return load_config_npz(filepath)
+    return load_config_yaml(filepath)
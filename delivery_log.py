@@ -0,0 +1,104 @@
+import csv
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+
+class DeliveryLog:
+    """CSV log of package deliveries, shared by all sorting offices of a run."""
+
+    HEADER = [
+        "Dispatch Time",
+        "Package ID",
+        "Station ID",
+        "Drone ID",
+        "Delivery Time",
+        "Collection Time",
+        "Postage Time",
+    ]
+
+    def __init__(self, filename: Path):
+        self._filename = filename
+
+        with self._filename.open(mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(DeliveryLog.HEADER)
+
+    def get_filename(self) -> Path:
+        return self._filename
+
+    def write(
+        self,
+        time_of_dispatch: float,
+        package_id: int,
+        station_id: int,
+        drone_id: int,
+        delivery_time: float,
+        postage_time: float,
+        collection_time: Optional[float] = None,
+    ) -> None:
+        with self._filename.open(mode="a", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(
+                [
+                    time_of_dispatch,
+                    package_id,
+                    station_id,
+                    drone_id,
+                    delivery_time,
+                    collection_time,
+                    postage_time,
+                ]
+            )
+
+
+class DeliveryRecorder:
+    """
+    In-memory counterpart of DeliveryLog with the same write() method.
+    Rows are kept in plain lists and turned into a structured array on
+    request; a missing collection time becomes NaN.
+    """
+
+    DTYPE = np.dtype(
+        [
+            ("dispatch_time", np.float64),
+            ("package_id", np.int64),
+            ("station_id", np.int64),
+            ("drone_id", np.int64),
+            ("delivery_time", np.float64),
+            ("collection_time", np.float64),
+            ("postage_time", np.float64),
+        ]
+    )
+
+    def __init__(self):
+        self._rows: List[tuple] = []
+
+    def write(
+        self,
+        time_of_dispatch: float,
+        package_id: int,
+        station_id: int,
+        drone_id: int,
+        delivery_time: float,
+        postage_time: float,
+        collection_time: Optional[float] = None,
+    ) -> None:
+        self._rows.append(
+            (
+                time_of_dispatch,
+                package_id,
+                station_id,
+                drone_id,
+                delivery_time,
+                collection_time if collection_time is not None else np.nan,
+                postage_time,
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def to_array(self) -> np.ndarray:
+        return np.array(self._rows, dtype=DeliveryRecorder.DTYPE)
@@ -0,0 +1,80 @@
+import time
+from enum import Enum
+from queue import Empty, Full, Queue
+from typing import List, Optional
+
+
+class SimulationEventTypes(Enum):
+    DISPATCH = "DISPATCH"
+    DELIVERY = "DELIVERY"
+    COLLECTION = "COLLECTION"
+    EXPIRATION = "EXPIRATION"
+
+
+class SimulationEvent:
+    def __init__(
+        self,
+        event_type: SimulationEventTypes,
+        sim_time: float,
+        package_id: int,
+        station_id: int,
+        drone_id: Optional[int] = None,
+    ):
+        self._event_type = event_type
+        self._sim_time = sim_time
+        self._package_id = package_id
+        self._station_id = station_id
+        self._drone_id = drone_id
+        self._published_at = time.monotonic()
+
+    def get_event_type(self) -> SimulationEventTypes:
+        return self._event_type
+
+    def get_sim_time(self) -> float:
+        return self._sim_time
+
+    def get_package_id(self) -> int:
+        return self._package_id
+
+    def get_station_id(self) -> int:
+        return self._station_id
+
+    def get_drone_id(self) -> Optional[int]:
+        return self._drone_id
+
+    def get_latency(self) -> float:
+        """Wall-clock seconds elapsed since the event was published."""
+        return time.monotonic() - self._published_at
+
+
+class EventBus:
+    """
+    Bounded in-process queue carrying simulation events from the SimPy thread
+    to a consumer (e.g. the pygame loop). Publishing never blocks the
+    simulation: when the queue is full the event is dropped and counted.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self._queue: Queue[SimulationEvent] = Queue(maxsize=maxsize)
+        self._dropped = 0
+
+    def publish(self, event: SimulationEvent) -> bool:
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except Full:
+            self._dropped += 1
+            return False
+
+    def drain(self, max_events: Optional[int] = None) -> List[SimulationEvent]:
+        """Return all currently queued events (at most max_events) without blocking."""
+        events = []
+        while max_events is None or len(events) < max_events:
+            try:
+                events.append(self._queue.get_nowait())
+            except Empty:
+                break
+        return events
+
+    def get_num_of_dropped(self) -> int:
+        return self._dropped
@@ -1,17 +1,135 @@
-import random
-import yaml
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
 import typer
 
+CHUNK_SIZE = 100_000
+
+
+def generate_drones(rng: np.random.Generator, num_drones: int) -> Dict[str, np.ndarray]:
+    """Draw ids and velocities of all drones at once."""
+    return {
+        "drone_id": np.arange(1, num_drones + 1),
+        "drone_velocity": np.round(rng.uniform(3.0, 5.0, num_drones), 2),
+    }
+
+
+def generate_stations(
+    rng: np.random.Generator,
+    num_stations: int,
+    clusters: int = 0,
+    cluster_spread: float = 5.0,
+) -> Dict[str, np.ndarray]:
+    """
+    Draw ids, positions and locker counts of all stations at once.
+    With clusters > 0 stations are grouped around randomly placed centres
+    of uneven size (like towns of different population) instead of being
+    spread uniformly over the map.
+    """
+    if clusters > 0:
+        centres = rng.uniform(0, 100, (clusters, 2))
+        weights = rng.dirichlet(np.ones(clusters))
+        membership = rng.choice(clusters, num_stations, p=weights)
+        offsets = rng.normal(0.0, cluster_spread, (num_stations, 2))
+        positions = np.clip(np.rint(centres[membership] + offsets), 0, 100)
+        x = positions[:, 0].astype(np.int64)
+        y = positions[:, 1].astype(np.int64)
+    else:
+        x = rng.integers(0, 101, num_stations)
+        y = rng.integers(0, 100, num_stations)
+
+    return {
+        "station_id": np.arange(1, num_stations + 1),
+        "station_x": x,
+        "station_y": y,
+        "station_lockers": rng.integers(5, 21, num_stations),
+    }
+
+
+def generate_offices(rng: np.random.Generator, num_offices: int) -> Dict[str, np.ndarray]:
+    """Draw ids and positions of the sorting offices."""
+    return {
+        "office_id": np.arange(1, num_offices + 1),
+        "office_x": rng.integers(0, 101, num_offices),
+        "office_y": rng.integers(0, 101, num_offices),
+    }
+
+
+def write_yaml(output_file: Path, drones: dict, stations: dict, offices: dict) -> None:
+    """Write the config as YAML, chunk by chunk, in the layout of yaml.dump."""
+    with open(output_file, "w", encoding="utf-8") as f:
+        if offices["office_id"].size:
+            f.write("sorting_offices:\n")
+            f.write(
+                "".join(
+                    f"- id: {office_id}\n  position:\n  - {x}\n  - {y}\n"
+                    for office_id, x, y in zip(
+                        offices["office_id"].tolist(),
+                        offices["office_x"].tolist(),
+                        offices["office_y"].tolist(),
+                    )
+                )
+            )
+
+        f.write("drones:\n")
+        for start in range(0, drones["drone_id"].size, CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            f.write(
+                "".join(
+                    f"- id: {drone_id}\n  velocity: {velocity}\n"
+                    for drone_id, velocity in zip(
+                        drones["drone_id"][start:end].tolist(),
+                        drones["drone_velocity"][start:end].tolist(),
+                    )
+                )
+            )
+
+        f.write("package_stations:\n")
+        for start in range(0, stations["station_id"].size, CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            f.write(
+                "".join(
+                    f"- id: {station_id}\n  position:\n  - {x}\n  - {y}\n  lockers: {lockers}\n"
+                    for station_id, x, y, lockers in zip(
+                        stations["station_id"][start:end].tolist(),
+                        stations["station_x"][start:end].tolist(),
+                        stations["station_y"][start:end].tolist(),
+                        stations["station_lockers"][start:end].tolist(),
+                    )
+                )
+            )
+
+
+def write_npz(output_file: Path, drones: dict, stations: dict, offices: dict) -> None:
+    """Write the config as a compact NPZ archive, one array per field."""
+    with open(output_file, "wb") as f:
+        np.savez(f, **drones, **stations, **offices)
+
 
 def main(
     num_drones: int = typer.Option(10, help="Number of drones to generate."),
     num_stations: int = typer.Option(20, help="Number of package stations to generate."),
-    output_file: str = typer.Option(
-        "config.yaml", help="File to write the YAML config."
+    output_file: Path = typer.Option(
+        "config.yaml",
+        help="File to write the config to, '.npz' for the compact binary format.",
+    ),
+    num_offices: int = typer.Option(
+        0,
+        help="Number of sorting offices, 0 for the single office at (0, 0). "
+        "Drones are shared between offices at load time, so there can be "
+        "no more offices than drones.",
+    ),
+    seed: Optional[int] = typer.Option(None, help="Random seed for reproducible maps."),
+    clusters: int = typer.Option(
+        0, help="Number of station clusters, 0 for a uniform layout."
+    ),
+    cluster_spread: float = typer.Option(
+        5.0, help="Standard deviation of station positions around a cluster centre."
     ),
 ):
     """
-    Generate a YAML file with random drones and package stations.
+    Generate a config file with random drones and package stations.
     Each drone has:
       - id
       - velocity
@@ -20,32 +138,29 @@ def main(
       - id
       - position (x, y)
       - number of lockers
+
+    Each sorting office (if requested) has:
+      - id
+      - position (x, y)
     """
+    if num_offices > num_drones:
+        raise typer.BadParameter(
+            f"{num_offices} offices need at least as many drones, got {num_drones}.",
+            param_hint="'--num-offices'",
+        )
 
-    # Generate drone data
-    drones = []
-    for i in range(num_drones):
-        drone_id = i + 1
-        velocity = round(random.uniform(3.0, 5.0), 2)
-        drones.append({"id": drone_id, "velocity": velocity})
-
-    # Generate station data
-    stations = []
-    for i in range(num_stations):
-        station_id = i + 1
-        x = int(random.randint(0, 100))
-        y = int(random.uniform(0, 100))
-        lockers = random.randint(5, 20)
-        stations.append({"id": station_id, "position": [x, y], "lockers": lockers})
-
-    # Build top-level config structure
-    config = {"drones": drones, "package_stations": stations}
-
-    # Write YAML to file
-    with open(output_file, "w", encoding="utf-8") as f:
-        yaml.dump(config, f, sort_keys=False)
+    rng = np.random.default_rng(seed)
+
+    drones = generate_drones(rng, num_drones)
+    stations = generate_stations(rng, num_stations, clusters, cluster_spread)
+    offices = generate_offices(rng, num_offices)
+
+    if output_file.suffix == ".npz":
+        write_npz(output_file, drones, stations, offices)
+    else:
+        write_yaml(output_file, drones, stations, offices)
 
-    typer.echo(f"YAML configuration saved to '{output_file}'.")
+    typer.echo(f"Configuration saved to '{output_file}'.")
 
 
 if __name__ == "__main__":
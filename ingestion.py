@@ -0,0 +1,238 @@
+import asyncio
+import os
+import stat
+import sys
+import threading
+from queue import Empty, Full, Queue
+from time import monotonic
+from typing import Awaitable, Callable, Generator, List, Optional
+
+from package import Package
+from simpy import Environment, Timeout
+
+
+def _is_socket(path: str) -> bool:
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+class OrderIngestor:
+    """
+    Feeds external package orders into a running simulation.
+
+    An asyncio loop in a background thread reads orders, one station id per
+    line, from stdin ('-'), a local socket ('unix:/path/to/socket') or a
+    named pipe / file (any other path); regular files, which asyncio cannot
+    watch, are read in a worker thread. Each chunk read is turned into a
+    batch of station ids and put on a bounded queue; when the queue is full
+    the reader waits, so the producer is slowed down instead of memory
+    growing. A SimPy process drains the queue every 'poll_interval'
+    simulation seconds and hands the packages to the sorting office, so the
+    SimPy loop never waits on I/O. An error in the reader thread is raised
+    again by that process, i.e. from env.run().
+    """
+
+    def __init__(
+        self,
+        env: Environment,
+        sorting_office,
+        source: str,
+        poll_interval: float = 1.0,
+        max_pending_batches: int = 64,
+        read_size: int = 65536,
+        first_package_id: int = 1,
+    ):
+        self._env = env
+        self._sorting_office = sorting_office
+        self._source = source
+        self._poll_interval = poll_interval
+        self._read_size = read_size
+        self._next_package_id = first_package_id
+
+        self._batches: Queue[List[int]] = Queue(maxsize=max_pending_batches)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+        self._received = 0
+        self._injected = 0
+        self._malformed = 0
+        self._rejected = 0
+        # Wall-clock times of the first and latest read that brought data
+        self._first_read_time: Optional[float] = None
+        self._last_read_time: Optional[float] = None
+        self._received_by_first_read = 0
+
+    def start(self) -> None:
+        """Start reading orders and register the injecting process."""
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        self._env.process(self._inject_orders())
+
+    def stop(self) -> None:
+        """Stop reading orders; does nothing if the source is already exhausted."""
+        if self._loop is None or self._task is None or self._loop.is_closed():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        except RuntimeError:  # the loop closed in the meantime
+            pass
+
+    def _run_loop(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self._serve())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._error = e
+        finally:
+            self._loop.close()
+
+    async def _serve(self) -> None:
+        if self._source.startswith("unix:"):
+            path = self._source[len("unix:") :]
+            # Replace a stale socket, but never any other kind of file
+            if _is_socket(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(
+                lambda reader, writer: self._read_orders(reader.read), path=path
+            )
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                if _is_socket(path):
+                    os.remove(path)
+            return
+
+        loop = asyncio.get_running_loop()
+        if self._source == "-":
+            pipe = sys.stdin.buffer
+        else:
+            # Opening a named pipe blocks until a writer shows up
+            pipe = await loop.run_in_executor(None, open, self._source, "rb")
+
+        try:
+            mode = os.fstat(pipe.fileno()).st_mode
+            if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode):
+                reader = asyncio.StreamReader(limit=self._read_size * 2)
+                await loop.connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(reader), pipe
+                )
+                await self._read_orders(reader.read)
+            else:
+                await self._read_orders(
+                    lambda size: loop.run_in_executor(None, pipe.read, size)
+                )
+        finally:
+            if pipe is not sys.stdin.buffer:
+                pipe.close()
+
+    async def _read_orders(self, read: Callable[[int], Awaitable[bytes]]) -> None:
+        remainder = b""
+        while True:
+            data = await read(self._read_size)
+            if not data:
+                break
+            now = monotonic()
+            lines = (remainder + data).split(b"\n")
+            remainder = lines.pop()
+            batch = self._parse(lines)
+            if self._first_read_time is None:
+                self._first_read_time = now
+                self._received_by_first_read = self._received
+            self._last_read_time = now
+            await self._put_batch(batch)
+        await self._put_batch(self._parse([remainder]))
+
+    async def _put_batch(self, batch: List[int]) -> None:
+        """Queue a batch, waiting (and not reading further) while the queue is full."""
+        if not batch:
+            return
+        while True:
+            try:
+                self._batches.put_nowait(batch)
+                return
+            except Full:
+                await asyncio.sleep(0.01)
+
+    def _parse(self, lines: List[bytes]) -> List[int]:
+        batch = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            self._received += 1
+            try:
+                batch.append(int(line))
+            except ValueError:
+                self._malformed += 1
+        return batch
+
+    def _inject_orders(self) -> Generator[Timeout, None, None]:
+        """Process generator adding the queued orders as packages."""
+        stations = self._sorting_office._package_stations
+        while True:
+            if self._error is not None:
+                raise RuntimeError(
+                    f"Reading orders from '{self._source}' failed"
+                ) from self._error
+            while True:
+                try:
+                    batch = self._batches.get_nowait()
+                except Empty:
+                    break
+                for station_id in batch:
+                    if station_id not in stations:
+                        self._rejected += 1
+                        continue
+                    package = Package(self._next_package_id, station_id)
+                    package._postage_time = self._env.now
+                    self._sorting_office._add_package(package)
+                    self._next_package_id += 1
+                    self._injected += 1
+
+            yield self._env.timeout(self._poll_interval)
+
+    def get_num_of_received(self) -> int:
+        return self._received
+
+    def get_num_of_injected(self) -> int:
+        return self._injected
+
+    def get_num_of_malformed(self) -> int:
+        return self._malformed
+
+    def get_num_of_rejected(self) -> int:
+        """Orders for stations that do not exist."""
+        return self._rejected
+
+    def get_throughput(self) -> Optional[float]:
+        """
+        Orders received per wall-clock second while they were arriving, i.e.
+        between the first and the latest read; None until there are two reads.
+        """
+        if self._first_read_time is None:
+            return None
+        elapsed = self._last_read_time - self._first_read_time
+        if elapsed <= 0:
+            return None
+        return (self._received - self._received_by_first_read) / elapsed
+
+    def report(self) -> str:
+        throughput = self.get_throughput()
+        return (
+            f"Orders received: {self._received}, injected: {self._injected}, "
+            f"malformed: {self._malformed}, unknown station: {self._rejected}, "
+            "throughput: "
+            + (
+                f"{throughput:.1f} orders/s"
+                if throughput is not None
+                else "n/a (orders arrived in a single read)"
+            )
+        )
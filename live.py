@@ -0,0 +1,68 @@
+import threading
+from pathlib import Path
+
+import typer
+from config_loader import load_config
+from event_bus import EventBus
+from simpy.rt import RealtimeEnvironment
+from simulation import SystemEnvironment, build_domain_objects, build_sorting_offices
+from visualization import LiveController, build_scene, run_loop
+
+app = typer.Typer()
+
+
+@app.command()
+def run(
+    config_file_yaml: Path = typer.Argument(
+        ..., help="Path to the YAML or NPZ config file."
+    ),
+    until: int = typer.Option(200, help="How many simulation seconds to run."),
+    speed_factor: int = typer.Option(1, help="Visualization Speed factor"),
+    map_size_factor: int = typer.Option(5, help="Map size factor"),
+    random_time_ub: int = typer.Option(
+        20, help="Upper bound of randomized package generation."
+    ),
+    random_time_lb: int = typer.Option(
+        10, help="Lower bound of randomized package generation."
+    ),
+    queue_size: int = typer.Option(10000, help="Capacity of the event queue."),
+):
+    """
+    Run the simulation in a background thread and visualize its events live,
+    without going through package_deliveries.csv.
+    """
+    config = load_config(config_file_yaml)
+    event_bus = EventBus(maxsize=queue_size)
+
+    # Simulation side: realtime SimPy environment publishing on the bus
+    env = RealtimeEnvironment(factor=1.0 / speed_factor, strict=False)
+    sim_drones, sim_stations = build_domain_objects(config)
+    sorting_office = build_sorting_offices(
+        env, config, sim_drones, sim_stations, event_bus=event_bus, csv_filename=None
+    )
+    system = SystemEnvironment(env, sorting_office, random_time_lb, random_time_ub)
+    sim_thread = threading.Thread(
+        target=system.run_simulation, kwargs={"until": until}, daemon=True
+    )
+
+    # Visualization side: pygame loop consuming the bus
+    drones, stations, sorting_offices = build_scene(
+        config, speed_factor, map_size_factor
+    )
+    controller = LiveController(drones, stations, event_bus)
+
+    sim_thread.start()
+    run_loop(drones, stations, sorting_offices, controller, speed_factor)
+
+    typer.echo(
+        f"Max event latency: {controller.get_max_latency() * 1000:.1f} ms, "
+        f"dropped events: {event_bus.get_num_of_dropped()}."
+    )
+
+
+def main():
+    app()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from package import Package
 
 class LockerStates(Enum):
     FREE = "FREE"
+    RESERVED = "RESERVED"
     OCCUPIED = "OCCUPIED"
 
 
@@ -18,15 +19,24 @@ class Locker(ObjectBase):
     def get_state(self) -> LockerStates:
         return self._state
 
-    def load_package(self, package: Package) -> bool:
+    def reserve(self, package: Package) -> bool:
         if self._state == LockerStates.FREE:
+            self._package = package
+            self._state = LockerStates.RESERVED
+            return True
+        return False
+
+    def load_package(self, package: Package) -> bool:
+        if self._state == LockerStates.FREE or (
+            self._state == LockerStates.RESERVED and self._package == package
+        ):
             self._package = package
             self._state = LockerStates.OCCUPIED
             return True
         return False
 
     def remove_package(self) -> bool:
-        if self._state == LockerStates.OCCUPIED:
+        if self._state in (LockerStates.OCCUPIED, LockerStates.RESERVED):
             self._package = None
             self._state = LockerStates.FREE
             return True
@@ -1,227 +1,14 @@
-import csv
-import random
 from pathlib import Path
-from queue import Queue
-from typing import Dict, Generator, Optional
+from typing import Optional
 
 import typer
-import yaml
-from drone import Drone, DroneStates
-from package import Package
-from package_station import PackageStation
-from position import Position
-from simpy import Environment, Process, Resource, Timeout
-from simpy.resources.resource import Request
+from arrivals import read_order_trace, replay_orders
+from config_loader import load_config
+from ingestion import OrderIngestor
+from profiling import HandlerProfiler
 from simpy.rt import RealtimeEnvironment
-from utils import *
-
-
-class SortingOffice:
-
-    def __init__(
-        self,
-        env: Environment,
-        drones: Dict[int, Drone],
-        package_stations: Dict[int, PackageStation],
-    ):
-        self._env = env
-        self._drones = drones
-        self._package_stations = package_stations
-
-        self._station_distances_lut = generate_distance_lut(package_stations)
-
-        self._packages_to_send_queue: Queue[Package] = Queue()
-        self._drone_resource = Resource(env, capacity=len(drones))
-        self._csv_filename = Path("package_deliveries.csv")
-
-        with self._csv_filename.open(mode="w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                [
-                    "Dispatch Time",
-                    "Package ID",
-                    "Station ID",
-                    "Drone ID",
-                    "Delivery Time",
-                    "Collection Time",
-                    "Postage Time"
-                ]
-            )
-
-    def _get_distance_from_sorting_centre(self, station_id: int) -> Optional[float]:
-        """
-        Returns the distance from the sorting centre (ID = 0) to the given station_id.
-        If the lookup doesn't exist, returns None.
-        """
-        if station_id not in self._station_distances_lut:
-            return None
-
-        station_distances = self._station_distances_lut[station_id]
-        if 0 not in station_distances:
-            return None
-
-        return station_distances[0]
-
-    def _add_package(self, package: Package) -> None:
-        """Add a package to the queue of packages to send."""
-        self._packages_to_send_queue.put(package)
-        print(
-            f"[t={round(self._env.now, 2)}] Package {package.get_id()} added to the queue."
-        )
-        self._dispatch_package()
-
-    def _dispatch_package(self) -> None:
-        """Attempt to send a package from the queue if a drone is available."""
-        while not self._packages_to_send_queue.empty():
-            drone_id = self._get_first_free_drone_id()
-            if drone_id:
-                package = (
-                    self._packages_to_send_queue.get()
-                )  # Get the first queued package
-                station_id = package.get_package_station_id()
-                self._drones[drone_id].load_package(package)
-
-                self._env.process(self._send_package(package, station_id, drone_id))
-            else:
-                break
-
-    def _send_package(
-        self, package: Package, station_id: int, assigned_drone_id: int
-    ) -> Generator[Request | Timeout, None, None]:
-        """Process generator to send a package to the given station using a drone."""
-        with self._drone_resource.request() as req:
-            yield req
-
-            print(
-                f"[t={round(self._env.now, 2)}] Package '{package.get_id()}' assigned to drone '{assigned_drone_id}'."
-            )
-
-            print(
-                f"[t={round(self._env.now, 2)}] Sending package {package.get_id()} to station {station_id}..."
-            )
-
-            self._env.process(
-                self._complete_delivery(assigned_drone_id, package, station_id)
-            )
-
-    def _get_first_free_drone_id(self) -> Optional[int]:
-        """Choose first available drone, if no drones available return None"""
-        for id, drone in self._drones.items():
-            if drone.get_state() == DroneStates.IDLE:
-                return id
-
-        return None
-
-    def _complete_delivery(
-        self, drone_id: id, package: Package, station_id: int
-    ) -> Generator[Timeout, None, None]:
-        """Handle delivery, free up the drone after delivery is complete."""
-        distance = (
-            self._get_distance_from_sorting_centre(station_id) * 2
-        )  # There and back
-        travel_time = distance / self._drones[drone_id].get_velocity()
-
-        print(
-            f"[t={round(self._env.now, 2)}] Drone '{drone_id}' is traveling... Estimated time: {travel_time:.2f}s"
-        )
-
-        package.set_delivery_time(self._env.now + (travel_time / 2))
-        collection_time = self._env.now + (travel_time / 2) + random.uniform(5.0, 25.0)
-        if collection_time > package.get_expiration_time():
-            collection_time = None
-
-        self._log_package(
-            round(self._env.now, 2),
-            package.get_id(),
-            package.get_package_station_id(),
-            drone_id,
-            round(package.get_delivery_time(), 2),
-            package._postage_time,
-            round(collection_time, 2) if collection_time is not None else None,
-        )
-
-        # Drone unavailable until it returns
-        yield self._env.timeout(travel_time)
-
-        print(
-            f"[t={round(self._env.now, 2)}] Package {package.get_id()} delivered to station {station_id}."
-        )
-
-        if self._drones[drone_id].remove_package():
-            print(
-                f"[t={round(self._env.now, 2)}] Drone '{drone_id}' is available again."
-            )
-
-        self._dispatch_package()
-
-    def _log_package(
-        self,
-        time_of_dispatch: float,
-        package_id: int,
-        station_id: int,
-        drone_id: int,
-        delivery_time: float,
-        postage_time: float,
-        collection_time: Optional[None] = None,
-    ) -> None:
-        with self._csv_filename.open(mode="a", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(
-                [
-                    time_of_dispatch,
-                    package_id,
-                    station_id,
-                    drone_id,
-                    delivery_time,
-                    collection_time,
-                    postage_time
-                ]
-            )
-
-
-class SystemEnvironment:
-
-    def __init__(
-        self,
-        env: Environment,
-        sorting_office: SortingOffice,
-        random_time_lower_bound: int,
-        random_time_upper_bound: int,
-    ):
-        self._env = env
-        self._sorting_office = sorting_office
-        self._random_time_lower_bound = random_time_lower_bound
-        self._random_time_upper_bound = random_time_upper_bound
-
-    def run_simulation(self, until: int = 50) -> None:
-        def add_and_send_packages() -> Generator[Process | Timeout, None, None]:
-            package_id = 1
-            while True:
-                station: PackageStation = random.choice(
-                    list(self._sorting_office._package_stations.values())
-                )
-                package = Package(package_id, station.get_id())
-                package._postage_time = self._env.now
-                self._sorting_office._add_package(package)
-
-                package_id += 1
-
-                # Wait a random amount of time between each package
-                delay = random.randint(
-                    self._random_time_lower_bound, self._random_time_upper_bound
-                )
-
-                yield self._env.timeout(delay)
-
-        self._env.process(add_and_send_packages())
-
-        self._env.run(until=until)
-
-
-def load_config_yaml(filepath: str) -> dict:
-    """Load the YAML configuration file and return a dict."""
-    with open(filepath, "r") as f:
-        return yaml.safe_load(f)
+from simulation import SystemEnvironment, build_domain_objects, build_sorting_offices
+from soft_realtime import LagMonitor, SoftRealtimeEnvironment
 
 
 app = typer.Typer()
@@ -229,7 +16,7 @@ app = typer.Typer()
 
 @app.command()
 def run_sim(
-    config_file: Path = typer.Argument(..., help="Path to the YAML config file."),
+    config_file: Path = typer.Argument(..., help="Path to the YAML or NPZ config file."),
     until: int = typer.Option(200, help="How many simulation seconds to run."),
     factor: float = typer.Option(1.0, help="Simulation time scaling factor."),
     random_time_ub: int = typer.Option(
@@ -238,39 +25,123 @@ def run_sim(
     random_time_lb: int = typer.Option(
         10, help="upper bound of randomized package generation."
     ),
+    lag_budget: Optional[float] = typer.Option(
+        None,
+        help="Run in soft-realtime mode: catch up on overdue events and slip "
+        "once more than LAG_BUDGET seconds behind, then print a lag report.",
+    ),
+    orders: Optional[str] = typer.Option(
+        None,
+        help="Take packages from external orders instead of generating them: "
+        "'-' for stdin, 'unix:PATH' for a local socket or the path of a named "
+        "pipe or file.",
+    ),
+    orders_poll_interval: float = typer.Option(
+        1.0, help="Simulation seconds between two injections of queued orders."
+    ),
+    trace: Optional[Path] = typer.Option(
+        None,
+        help="Replay (time, station_id) orders from a recorded CSV or .npy "
+        "trace instead of generating packages.",
+    ),
+    trace_time_scale: float = typer.Option(
+        1.0, help="Multiply the trace's times, e.g. 0.5 to replay twice as fast."
+    ),
+    trace_sample: float = typer.Option(
+        1.0, help="Fraction of the trace's orders to replay."
+    ),
+    locker_admission: bool = typer.Option(
+        True,
+        help="Reserve a locker before dispatching a drone; packages for full "
+        "stations wait until a locker there is freed.",
+    ),
+    profile: bool = typer.Option(
+        False, help="Time the sorting office handlers and print a report."
+    ),
+    profile_pstats: Optional[str] = typer.Option(
+        None, help="Also run under cProfile and dump pstats here (implies --profile)."
+    ),
+    profile_collapsed: Optional[str] = typer.Option(
+        None,
+        help="Write a flamegraph collapsed-stack file here (implies --profile).",
+    ),
 ):
     """
     Load drones and package stations from CONFIG_FILE, then run a SimPy simulation
     for UNTIL simulation seconds.
     """
+    if orders is not None and trace is not None:
+        # Both number their packages from 1
+        raise typer.BadParameter(
+            "Take packages either from --orders or from --trace, not both.",
+            param_hint="'--trace'",
+        )
+
     # 1) Create environment
-    env = RealtimeEnvironment(factor=factor)
+    if lag_budget is None:
+        env = RealtimeEnvironment(factor=factor)
+    else:
+        env = SoftRealtimeEnvironment(
+            factor=factor,
+            lag_budget=lag_budget,
+            monitor=LagMonitor(lag_threshold=lag_budget / 2),
+        )
 
     # 2) Load config from YAML
-    config = load_config_yaml(config_file)
+    config = load_config(config_file)
 
     # 3) Build domain objects
-    drones = {}
-    for d in config.get("drones", []):
-        drone_id = d["id"]
-        velocity = d["velocity"]
-        drones[drone_id] = Drone(drone_id, velocity)
-
-    stations = {}
-    for s in config.get("package_stations", []):
-        station_id = s["id"]
-        position = Position(tuple(s["position"])[0], tuple(s["position"])[1])
-        lockers = s["lockers"]
-        stations[station_id] = PackageStation(station_id, position, lockers)
+    drones, stations = build_domain_objects(config)
 
     # 4) Create SortingOffice and controller
-    sorting_office = SortingOffice(env, drones, stations)
+    sorting_office = build_sorting_offices(
+        env, config, drones, stations, locker_admission=locker_admission
+    )
     controller = SystemEnvironment(env, sorting_office, random_time_lb, random_time_ub)
+    ingestor = None
+    if orders is not None:
+        ingestor = OrderIngestor(
+            env, sorting_office, orders, poll_interval=orders_poll_interval
+        )
 
-    # 5) Run the simulation
-    controller.run_simulation(until=until)
+    # 5) Run the simulation, with wall-clock time counted from now rather
+    #    than from before loading the config
+    env.sync()
+    if ingestor is not None:
+        ingestor.start()
+    if trace is not None:
+        env.process(
+            replay_orders(
+                env,
+                sorting_office,
+                read_order_trace(
+                    trace, time_scale=trace_time_scale, sample=trace_sample
+                ),
+            )
+        )
+    profile = profile or profile_pstats is not None or profile_collapsed is not None
+    profiler = (
+        HandlerProfiler(profile_pstats, profile_collapsed) if profile else None
+    )
+    controller.run_simulation(
+        until=until,
+        generate_packages=ingestor is None and trace is None,
+        profiler=profiler,
+    )
 
     typer.echo(f"Simulation finished at time={env.now}.")
+    typer.echo(
+        f"Packages held for a locker: {sorting_office.get_num_of_held_packages()} "
+        f"(total {sorting_office.get_holding_time():.1f}s), "
+        f"wasted trips: {sorting_office.get_num_of_wasted_trips()}."
+    )
+    if lag_budget is not None:
+        typer.echo(env.get_monitor().report())
+    if profiler is not None:
+        typer.echo(profiler.report())
+    if ingestor is not None:
+        ingestor.stop()
+        typer.echo(ingestor.report())
 
 
 def main():
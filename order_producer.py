@@ -0,0 +1,58 @@
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import typer
+from config_loader import load_config
+
+
+def main(
+    config_file: Path = typer.Argument(
+        ..., help="Path to the YAML or NPZ config file, to pick station ids from."
+    ),
+    target: str = typer.Option(
+        "-", help="'-' for stdout, 'unix:PATH' for a local socket or a named pipe path."
+    ),
+    count: int = typer.Option(1000, help="Number of orders to send."),
+    rate: float = typer.Option(100.0, help="Orders per second, 0 for as fast as possible."),
+    batch: int = typer.Option(10, help="Orders written at once."),
+    seed: Optional[int] = typer.Option(None, help="Random seed."),
+):
+    """
+    Stand-in for a real order feed: sends random station ids, one per line,
+    to a simulation started with 'main.py --orders TARGET'.
+    """
+    rng = random.Random(seed)
+    station_ids = [s["id"] for s in load_config(config_file).get("package_stations", [])]
+
+    if target.startswith("unix:"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[len("unix:") :])
+        out = sock.makefile("wb")
+    elif target == "-":
+        out = sys.stdout.buffer
+    else:
+        out = open(target, "wb")
+
+    start = time.monotonic()
+    with out:
+        for sent in range(0, count, batch):
+            n = min(batch, count - sent)
+            out.write(
+                "".join(f"{rng.choice(station_ids)}\n" for _ in range(n)).encode()
+            )
+            out.flush()
+            if rate > 0:
+                delay = start + (sent + n) / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+    elapsed = time.monotonic() - start
+    typer.echo(f"Sent {count} orders in {elapsed:.2f}s.", err=True)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from locker import Locker, LockerStates
 from object_base import ObjectBase
@@ -11,15 +11,25 @@ class PackageStation(ObjectBase):
     def __init__(self, id: int, position: Position, num_of_lockers: int):
         super().__init__(id)
         self._position = position
-        self._locker: List[Locker] = [Locker(i) for i in range(num_of_lockers)]
+        self._num_of_lockers = num_of_lockers
+        # Lockers are created on first use, stations that never receive a
+        # package cost no Locker objects
+        self._locker: Optional[List[Locker]] = None
+
+    def _get_lockers(self) -> List[Locker]:
+        if self._locker is None:
+            self._locker = [Locker(i) for i in range(self._num_of_lockers)]
+        return self._locker
 
     def get_position(self) -> Tuple[int, int]:
         return self._position.get_position()
 
     def get_num_of_lockers(self) -> int:
-        return len(self._locker)
+        return self._num_of_lockers
 
     def get_num_of_free_lockers(self) -> int:
+        if self._locker is None:
+            return self._num_of_lockers
         return len(
             [
                 locker
@@ -28,21 +38,39 @@ class PackageStation(ObjectBase):
             ]
         )
 
+    def reserve_locker(self, package: Package) -> bool:
+        """Hold a free locker for a package on its way; False if there is none."""
+        for locker in self._get_lockers():
+            if locker.get_state() == LockerStates.FREE:
+                return locker.reserve(package)
+        return False
+
     def load_package(self, package: Package) -> None:
-        for locker in self._locker:
+        """Put the package in the locker reserved for it, or else in a free one."""
+        lockers = self._get_lockers()
+        for locker in lockers:
+            if (
+                locker.get_state() == LockerStates.RESERVED
+                and locker.get_package() == package
+            ):
+                locker.load_package(package)
+                return
+        for locker in lockers:
             if locker.get_state() == LockerStates.FREE:
                 locker.load_package(package)
                 break
-            else:
-                raise ValueError("There is no free locker")
+        else:
+            raise ValueError("There is no free locker")
 
     def remove_package(self, package: Package) -> None:
+        if self._locker is None:
+            raise ValueError("There is no occupied locker")
         for locker in self._locker:
-            if locker.get_state() == LockerStates.OCCUPIED:
-                if locker.get_package() == package:
-                    locker.remove_package()
-                    break
-                else:
-                    raise ValueError("Package not found")
-            else:
-                raise ValueError("There is no occupied locker")
+            if (
+                locker.get_state() in (LockerStates.OCCUPIED, LockerStates.RESERVED)
+                and locker.get_package() == package
+            ):
+                locker.remove_package()
+                break
+        else:
+            raise ValueError("Package not found")
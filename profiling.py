@@ -0,0 +1,221 @@
+import builtins
+import cProfile
+import sys
+from collections import defaultdict
+from time import perf_counter
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+from analytics import TDigest
+
+# SortingOffice methods called directly and ones returning SimPy process
+# generators, which are timed one resume at a time
+HANDLERS = (
+    "_add_package",
+    "_dispatch_package",
+    "_hold_package",
+    "_on_locker_freed",
+    "_log_package",
+    "_publish_event",
+)
+PROCESSES = ("_send_package", "_complete_delivery", "_fly", "_collect_package")
+
+
+class HandlerStats:
+    """Call count, cumulative and approximate percentile wall time of a handler."""
+
+    def __init__(self):
+        self._calls = 0
+        self._total = 0.0
+        self._digest = TDigest()
+        self._pending: List[float] = []
+
+    def add(self, elapsed: float) -> None:
+        self._calls += 1
+        self._total += elapsed
+        self._pending.append(elapsed)
+        if len(self._pending) >= 4096:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._digest.update(self._pending)
+            self._pending = []
+
+    def get_calls(self) -> int:
+        return self._calls
+
+    def get_total(self) -> float:
+        return self._total
+
+    def quantile(self, q: float) -> float:
+        self._flush()
+        return self._digest.quantile(q)
+
+
+class HandlerProfiler:
+    """
+    Opt-in profiler for the simulation event loop.
+
+    attach() replaces the SortingOffice handlers and process generator
+    methods on the instance (and 'print' in its module) with thin timing
+    wrappers; run() then runs the simulation, optionally under cProfile.
+    Times are inclusive (a handler's time includes the handlers it calls).
+    For the collapsed-stack output each frame gets its own time only.
+    attach_environment() books a realtime environment's waiting to a
+    'sleep' frame, so that whatever is left outside the handlers is SimPy's
+    own scheduling.
+    """
+
+    ROOT = "run_simulation"
+
+    def __init__(
+        self, pstats_file: Optional[str] = None, collapsed_file: Optional[str] = None
+    ):
+        self._pstats_file = pstats_file
+        self._collapsed_file = collapsed_file
+        self._stats: Dict[str, HandlerStats] = defaultdict(HandlerStats)
+        self._collapsed: Dict[Tuple[str, ...], float] = defaultdict(float)
+        # Active handlers: [name, time spent in the handlers it called]
+        self._stack: List[list] = []
+        self._restore: List[Callable[[], None]] = []
+        self._total_time = 0.0
+
+    def _enter(self, name: str) -> float:
+        self._stack.append([name, 0.0])
+        return perf_counter()
+
+    def _exit(self, start: float) -> None:
+        elapsed = perf_counter() - start
+        name, child_time = self._stack.pop()
+        self._stats[name].add(elapsed)
+        path = (HandlerProfiler.ROOT,) + tuple(f[0] for f in self._stack) + (name,)
+        self._collapsed[path] += elapsed - child_time
+        if self._stack:
+            self._stack[-1][1] += elapsed
+
+    def wrap_handler(self, obj, attr: str, name: Optional[str] = None) -> None:
+        """Time every call of obj.attr."""
+        original = getattr(obj, attr)
+        name = name or attr
+
+        def timed(*args, **kwargs):
+            start = self._enter(name)
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._exit(start)
+
+        had_attr = attr in vars(obj)
+        setattr(obj, attr, timed)
+        self._restore.append(
+            (lambda: setattr(obj, attr, original))
+            if had_attr
+            else (lambda: delattr(obj, attr))
+        )
+
+    def wrap_process(self, obj, attr: str) -> None:
+        """Time every resume of the generators returned by obj.attr."""
+        original = getattr(obj, attr)
+
+        def timed(*args, **kwargs):
+            return self.timed_generator(attr, original(*args, **kwargs))
+
+        setattr(obj, attr, timed)
+        self._restore.append(lambda: delattr(obj, attr))
+
+    def timed_generator(self, name: str, generator: Generator) -> Generator:
+        value, error = None, None
+        while True:
+            start = self._enter(name)
+            try:
+                if error is None:
+                    event = generator.send(value)
+                else:
+                    event = generator.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._exit(start)
+
+            try:
+                value, error = (yield event), None
+            except GeneratorExit:
+                generator.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+    def attach(self, sorting_office) -> None:
+        """Instrument a SortingOffice, or every office of a SortingOfficeNetwork."""
+        if hasattr(sorting_office, "get_sorting_offices"):
+            for office in sorting_office.get_sorting_offices().values():
+                self.attach(office)
+            return
+
+        for attr in HANDLERS:
+            self.wrap_handler(sorting_office, attr)
+        for attr in PROCESSES:
+            self.wrap_process(sorting_office, attr)
+
+        module = sys.modules[type(sorting_office).__module__]
+        if "print" not in vars(module):
+            module.print = builtins.print
+            self._restore.append(lambda: delattr(module, "print"))
+            self.wrap_handler(module, "print")
+
+    def attach_environment(self, env) -> None:
+        """Time the wall-clock sleeps of a (soft) realtime environment's step()."""
+        module = sys.modules[type(env).step.__module__]
+        if "sleep" in vars(module):
+            self.wrap_handler(module, "sleep")
+
+    def detach(self) -> None:
+        """Remove all wrappers."""
+        while self._restore:
+            self._restore.pop()()
+
+    def run(self, func: Callable[[], None]) -> None:
+        """Run func (the simulation loop), then write the requested dumps."""
+        profile = cProfile.Profile() if self._pstats_file else None
+
+        start = perf_counter()
+        if profile is not None:
+            profile.runcall(func)
+        else:
+            func()
+        self._total_time = perf_counter() - start
+
+        handler_time = sum(
+            t for path, t in self._collapsed.items() if len(path) > 1
+        )
+        self._collapsed[(HandlerProfiler.ROOT,)] += self._total_time - handler_time
+
+        if profile is not None:
+            profile.dump_stats(self._pstats_file)
+        if self._collapsed_file:
+            self.write_collapsed(self._collapsed_file)
+
+    def write_collapsed(self, filename: str) -> None:
+        """Write 'frame;frame;frame microseconds' lines, as read by flamegraph.pl."""
+        with open(filename, "w") as f:
+            for path, seconds in sorted(self._collapsed.items()):
+                f.write(f"{';'.join(path)} {max(round(seconds * 1e6), 0)}\n")
+
+    def get_stats(self) -> Dict[str, HandlerStats]:
+        return dict(self._stats)
+
+    def report(self) -> str:
+        lines = [
+            f"{'handler':<20} {'calls':>9} {'total ms':>10} {'mean us':>9} "
+            f"{'p50 us':>9} {'p99 us':>9}"
+        ]
+        for name, stats in sorted(
+            self._stats.items(), key=lambda item: -item[1].get_total()
+        ):
+            lines.append(
+                f"{name:<20} {stats.get_calls():>9} {stats.get_total() * 1e3:>10.1f} "
+                f"{stats.get_total() / stats.get_calls() * 1e6:>9.1f} "
+                f"{stats.quantile(0.5) * 1e6:>9.1f} {stats.quantile(0.99) * 1e6:>9.1f}"
+            )
+        lines.append(f"Total run time: {self._total_time * 1e3:.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,271 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import typer
+from config_loader import load_config
+from delivery_log import DeliveryLog, DeliveryRecorder
+from simulation import build_domain_objects, simulate
+from utils import assign_to_sorting_offices
+
+
+def _bisect(points: np.ndarray, indices: np.ndarray, parts: int) -> List[np.ndarray]:
+    """
+    Split 'indices' into 'parts' spatially compact groups of near-equal size,
+    cutting along the wider axis each time (like building a k-d tree).
+    """
+    if parts == 1 or indices.size <= 1:
+        return [indices] + [indices[:0]] * (parts - 1)
+
+    left_parts = parts // 2
+    selected = points[indices]
+    axis = int(np.argmax(np.ptp(selected, axis=0)))
+    order = indices[np.argsort(selected[:, axis], kind="stable")]
+    cut = indices.size * left_parts // parts
+    return _bisect(points, order[:cut], left_parts) + _bisect(
+        points, order[cut:], parts - left_parts
+    )
+
+
+def partition_config(config: dict, num_shards: int) -> List[dict]:
+    """
+    Split a config into independent regional configs, one per shard.
+
+    If the config declares sorting offices, the offices are grouped by
+    region and each shard keeps its offices together with their drones and
+    the stations nearest to them, exactly as in the unsharded run (groups
+    of offices without any station are left out).
+    Otherwise stations are split into regions of near-equal size, each
+    served by its own office at the centre of the region, and drones are
+    shared out in proportion to the number of stations.
+    """
+    stations = config.get("package_stations", [])
+    drones = config.get("drones", [])
+    offices = config.get("sorting_offices") or []
+
+    if len(offices) > 1:
+        num_shards = min(num_shards, len(offices))
+        domain_drones, domain_stations = build_domain_objects(config)
+        assignment = assign_to_sorting_offices(config, domain_drones, domain_stations)
+        station_by_id = {s["id"]: s for s in stations}
+        drone_by_id = {d["id"]: d for d in drones}
+
+        positions = np.array([o["position"] for o in offices], dtype=np.float64)
+        shards = []
+        for group in _bisect(positions, np.arange(len(offices)), num_shards):
+            shard_offices, shard_drones, shard_stations = [], [], []
+            for i in group.tolist():
+                office = offices[i]
+                _, office_drones, office_stations = assignment[office["id"]]
+                shard_offices.append({**office, "drones": list(office_drones)})
+                shard_drones += [drone_by_id[d] for d in office_drones]
+                shard_stations += [station_by_id[s] for s in office_stations]
+            if shard_stations:
+                shards.append(
+                    {
+                        "sorting_offices": shard_offices,
+                        "drones": shard_drones,
+                        "package_stations": shard_stations,
+                    }
+                )
+        return shards
+
+    num_shards = max(1, min(num_shards, len(stations), len(drones)))
+    positions = np.array([s["position"] for s in stations], dtype=np.float64)
+    groups = _bisect(positions, np.arange(len(stations)), num_shards)
+
+    # Largest remainder split of the drones, at least one per shard
+    sizes = np.array([group.size for group in groups])
+    quotas = sizes / sizes.sum() * (len(drones) - num_shards)
+    counts = np.floor(quotas).astype(np.int64) + 1
+    remaining = len(drones) - counts.sum()
+    counts[np.argsort(quotas - np.floor(quotas))[::-1][:remaining]] += 1
+    bounds = np.r_[0, np.cumsum(counts)]
+
+    shards = []
+    for i, group in enumerate(groups):
+        centre = np.rint(positions[group].mean(axis=0)).astype(np.int64).tolist()
+        shards.append(
+            {
+                "sorting_offices": [{"id": i + 1, "position": centre}],
+                "drones": drones[bounds[i] : bounds[i + 1]],
+                "package_stations": [stations[j] for j in group.tolist()],
+            }
+        )
+    return shards
+
+
+def _run_shard(args: Tuple[dict, dict]) -> Tuple[np.ndarray, Dict[str, float]]:
+    shard_config, options = args
+    return simulate(shard_config, with_metrics=True, **options)
+
+
+def merge_metrics(shard_metrics: List[Dict[str, float]]) -> Dict[str, float]:
+    """Add up the counters of all shards."""
+    return {
+        name: sum(metrics[name] for metrics in shard_metrics)
+        for name in ("held_packages", "holding_time", "wasted_trips")
+    }
+
+
+def simulate_sharded(
+    config: dict,
+    num_shards: Optional[int] = None,
+    until: float = 200,
+    random_time_lb: int = 10,
+    random_time_ub: int = 20,
+    seed: Optional[int] = None,
+    locker_admission: bool = True,
+) -> Tuple[np.ndarray, Dict[str, float], List[Dict[str, float]]]:
+    """
+    Run each regional shard of the config in its own process and merge the
+    results into one structured array ordered by dispatch time, with an
+    extra 'shard' field. Package ids are offset per shard so they stay
+    unique. Also returns the merged metrics and those of every shard.
+
+    Stations are picked uniformly in the unsharded run, so a shard with a
+    fraction f of the stations generates packages 1 / f times less often,
+    and every station keeps the arrival rate of the unsharded run.
+    """
+    if num_shards is None:
+        num_shards = os.cpu_count() or 1
+    shard_configs = partition_config(config, num_shards)
+    num_shards = len(shard_configs)
+    num_stations = sum(len(c["package_stations"]) for c in shard_configs)
+
+    jobs = [
+        (
+            shard_config,
+            {
+                "until": until,
+                "random_time_lb": random_time_lb,
+                "random_time_ub": random_time_ub,
+                "arrival_time_scale": num_stations
+                / len(shard_config["package_stations"]),
+                "seed": None if seed is None else seed + i,
+                "locker_admission": locker_admission,
+            },
+        )
+        for i, shard_config in enumerate(shard_configs)
+    ]
+    with ProcessPoolExecutor(max_workers=num_shards) as executor:
+        results = list(executor.map(_run_shard, jobs))
+
+    dtype = np.dtype(DeliveryRecorder.DTYPE.descr + [("shard", np.int64)])
+    merged = np.empty(sum(r[0].size for r in results), dtype=dtype)
+    start, package_id_offset = 0, 0
+    for i, (deliveries, _) in enumerate(results):
+        end = start + deliveries.size
+        for name in DeliveryRecorder.DTYPE.names:
+            merged[name][start:end] = deliveries[name]
+        merged["package_id"][start:end] += package_id_offset
+        merged["shard"][start:end] = i
+        if deliveries.size:
+            package_id_offset += int(deliveries["package_id"].max())
+        start = end
+    merged = merged[np.argsort(merged["dispatch_time"], kind="stable")]
+
+    shard_metrics = [metrics for _, metrics in results]
+    return merged, merge_metrics(shard_metrics), shard_metrics
+
+
+def write_metrics_csv(
+    filename: Path, metrics: Dict[str, float], shard_metrics: List[Dict[str, float]]
+) -> None:
+    """Write one row of metrics per shard and a last 'total' row."""
+    with filename.open(mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Shard", "Held Packages", "Holding Time", "Wasted Trips"])
+        rows = list(enumerate(shard_metrics)) + [("total", metrics)]
+        for shard, m in rows:
+            writer.writerow(
+                [shard, m["held_packages"], m["holding_time"], m["wasted_trips"]]
+            )
+
+
+def write_deliveries_csv(filename: Path, deliveries: np.ndarray) -> None:
+    """
+    Write deliveries in the DeliveryLog layout, plus a Shard column for
+    merged deliveries.
+    """
+    with filename.open(mode="w", newline="") as file:
+        writer = csv.writer(file)
+        shard_header = ["Shard"] if "shard" in deliveries.dtype.names else []
+        writer.writerow(DeliveryLog.HEADER + shard_header)
+        for row in deliveries.tolist():
+            collection = row[5]
+            writer.writerow(
+                row[:5] + (None if np.isnan(collection) else collection,) + row[6:]
+            )
+
+
+app = typer.Typer()
+
+
+@app.command()
+def run(
+    config_file: Path = typer.Argument(..., help="Path to the YAML or NPZ config file."),
+    shards: int = typer.Option(
+        os.cpu_count() or 1, help="Number of regional shards (processes)."
+    ),
+    until: int = typer.Option(200, help="How many simulation seconds to run."),
+    random_time_ub: int = typer.Option(
+        20, help="Upper bound of randomized package generation."
+    ),
+    random_time_lb: int = typer.Option(
+        10, help="Lower bound of randomized package generation."
+    ),
+    seed: Optional[int] = typer.Option(None, help="Random seed of the first shard."),
+    locker_admission: bool = typer.Option(
+        True, help="Reserve a locker before dispatching a drone."
+    ),
+    output_file: Path = typer.Option(
+        Path("package_deliveries.csv"), help="CSV file for the merged deliveries."
+    ),
+    metrics_file: Optional[Path] = typer.Option(
+        None, help="Also write the per-shard and total metrics to this CSV file."
+    ),
+):
+    """
+    Split the scenario of CONFIG_FILE into regional shards, simulate them in
+    parallel processes (without realtime pacing) and merge their deliveries.
+    """
+    config = load_config(config_file)
+    deliveries, metrics, shard_metrics = simulate_sharded(
+        config,
+        num_shards=shards,
+        until=until,
+        random_time_lb=random_time_lb,
+        random_time_ub=random_time_ub,
+        seed=seed,
+        locker_admission=locker_admission,
+    )
+    write_deliveries_csv(output_file, deliveries)
+    if metrics_file is not None:
+        write_metrics_csv(metrics_file, metrics, shard_metrics)
+
+    for i, m in enumerate(shard_metrics):
+        typer.echo(
+            f"Shard {i}: held packages {m['held_packages']}, "
+            f"holding time {m['holding_time']:.1f}s, "
+            f"wasted trips {m['wasted_trips']}."
+        )
+    typer.echo(
+        f"Total: held packages {metrics['held_packages']}, "
+        f"holding time {metrics['holding_time']:.1f}s, "
+        f"wasted trips {metrics['wasted_trips']}."
+    )
+    typer.echo(f"{deliveries.size} deliveries written to '{output_file}'.")
+    if metrics_file is not None:
+        typer.echo(f"Metrics written to '{metrics_file}'.")
+
+
+def main():
+    app()
+
+
+if __name__ == "__main__":
+    main()
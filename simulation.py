@@ -0,0 +1,614 @@
+import random
+from pathlib import Path
+from collections import deque
+from typing import Deque, Dict, Generator, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from arrivals import replay_orders
+from delivery_log import DeliveryLog, DeliveryRecorder
+from drone import Drone, DroneStates
+from event_bus import EventBus, SimulationEvent, SimulationEventTypes
+from package import Package, PackageStates
+from package_station import PackageStation
+from position import Position
+from profiling import HandlerProfiler
+from simpy import Environment, Process, Resource, Timeout
+from simpy.resources.resource import Request
+from utils import *
+
+
+class Flight:
+    """A drone's round trip to a station with one package."""
+
+    def __init__(
+        self,
+        drone_id: int,
+        package: Package,
+        station_id: int,
+        departure_time: float,
+        travel_time: float,
+        collection_time: Optional[float],
+    ):
+        self.drone_id = drone_id
+        self.package = package
+        self.station_id = station_id
+        self.departure_time = departure_time
+        self.travel_time = travel_time
+        self.collection_time = collection_time
+        self.arrived = False
+        self.delivered = False
+        # The drone leaves the fleet when it is back (see snapshot.fork)
+        self.retire = False
+
+
+class SortingOffice:
+
+    def __init__(
+        self,
+        env: Environment,
+        drones: Dict[int, Drone],
+        package_stations: Dict[int, PackageStation],
+        event_bus: Optional[EventBus] = None,
+        csv_filename: Optional[Path] = Path("package_deliveries.csv"),
+        position: Position = Position(0, 0),
+        delivery_log: Optional[DeliveryLog] = None,
+        rng: Optional[random.Random] = None,
+        verbose: bool = True,
+        locker_admission: bool = True,
+    ):
+        self._env = env
+        self._drones = drones
+        self._package_stations = package_stations
+        self._event_bus = event_bus
+        self._position = position
+        self._rng = rng if rng is not None else random
+        self._verbose = verbose
+        self._locker_admission = locker_admission
+
+        self._station_distances_lut = generate_distance_lut(
+            package_stations, position.get_position()
+        )
+
+        self._packages_to_send_queue: Deque[Package] = deque()
+        # Packages whose station had no free locker at dispatch time, waiting
+        # (with the time they started waiting) for a locker there to be freed
+        self._holding_queues: Dict[int, Deque[Tuple[Package, float]]] = {}
+        self._num_of_held_packages = 0
+        self._holding_time = 0.0
+        self._num_of_wasted_trips = 0
+        # In-flight drones and delivered packages not yet collected, kept so
+        # the logical state can be snapshotted (see snapshot.py)
+        self._flights: Dict[int, Flight] = {}
+        # Keyed by the Package itself, as ids from different sources can clash
+        self._pending_collections: Dict[
+            Package, Tuple[Package, int, Optional[float]]
+        ] = {}
+        self._drone_resource = Resource(env, capacity=len(drones))
+
+        if delivery_log is None and csv_filename is not None:
+            delivery_log = DeliveryLog(csv_filename)
+        self._delivery_log = delivery_log
+
+    def get_position(self) -> Tuple[int, int]:
+        return self._position.get_position()
+
+    def get_num_of_held_packages(self) -> int:
+        """How many times a package had to wait for a locker before dispatch."""
+        return self._num_of_held_packages
+
+    def get_holding_time(self) -> float:
+        """Total simulation time packages spent waiting for a locker."""
+        return self._holding_time
+
+    def get_num_of_wasted_trips(self) -> int:
+        """Trips that reached a station with no free locker and came back loaded."""
+        return self._num_of_wasted_trips
+
+    def _get_distance_from_sorting_centre(self, station_id: int) -> Optional[float]:
+        """
+        Returns the distance from the sorting centre (ID = 0) to the given station_id.
+        If the lookup doesn't exist, returns None.
+        """
+        if station_id not in self._station_distances_lut:
+            return None
+
+        station_distances = self._station_distances_lut[station_id]
+        if 0 not in station_distances:
+            return None
+
+        return station_distances[0]
+
+    def _add_package(self, package: Package) -> None:
+        """Add a package to the queue of packages to send."""
+        self._packages_to_send_queue.append(package)
+        if self._verbose:
+            print(
+                f"[t={round(self._env.now, 2)}] Package {package.get_id()} added to the queue."
+            )
+        self._dispatch_package()
+
+    def _dispatch_package(self) -> None:
+        """
+        Attempt to send a package from the queue if a drone is available.
+        With locker admission, a locker is reserved at the target station in
+        the same step the drone is assigned; packages for full stations are
+        moved to the station's holding queue instead.
+        """
+        while self._packages_to_send_queue:
+            drone_id = self._get_first_free_drone_id()
+            if drone_id:
+                package = (
+                    self._packages_to_send_queue.popleft()
+                )  # Get the first queued package
+                station_id = package.get_package_station_id()
+                if self._locker_admission and not self._package_stations[
+                    station_id
+                ].reserve_locker(package):
+                    self._hold_package(package, station_id)
+                    continue
+                self._drones[drone_id].load_package(package)
+                package.set_state(PackageStates.IN_TRANSPORT)
+
+                self._env.process(self._send_package(package, station_id, drone_id))
+            else:
+                break
+
+    def _hold_package(self, package: Package, station_id: int) -> None:
+        """Park a package until a locker at its station is freed."""
+        self._holding_queues.setdefault(station_id, deque()).append(
+            (package, self._env.now)
+        )
+        self._num_of_held_packages += 1
+        if self._verbose:
+            print(
+                f"[t={round(self._env.now, 2)}] Package {package.get_id()} waits for a free locker at station {station_id}."
+            )
+
+    def _on_locker_freed(self, station_id: int) -> None:
+        """Wake the package waiting longest for this station, if any."""
+        holding_queue = self._holding_queues.get(station_id)
+        if holding_queue:
+            package, held_since = holding_queue.popleft()
+            self._holding_time += self._env.now - held_since
+            # It has waited longer than anything queued, so it goes first
+            self._packages_to_send_queue.appendleft(package)
+        self._dispatch_package()
+
+    def _send_package(
+        self, package: Package, station_id: int, assigned_drone_id: int
+    ) -> Generator[Request | Timeout, None, None]:
+        """Process generator to send a package to the given station using a drone."""
+        with self._drone_resource.request() as req:
+            yield req
+
+            if self._verbose:
+                print(
+                    f"[t={round(self._env.now, 2)}] Package '{package.get_id()}' assigned to drone '{assigned_drone_id}'."
+                )
+
+            if self._verbose:
+                print(
+                    f"[t={round(self._env.now, 2)}] Sending package {package.get_id()} to station {station_id}..."
+                )
+
+            self._env.process(
+                self._complete_delivery(assigned_drone_id, package, station_id)
+            )
+
+    def _get_first_free_drone_id(self) -> Optional[int]:
+        """Choose first available drone, if no drones available return None"""
+        for id, drone in self._drones.items():
+            if drone.get_state() == DroneStates.IDLE:
+                return id
+
+        return None
+
+    def _complete_delivery(
+        self, drone_id: id, package: Package, station_id: int
+    ) -> Generator[Timeout, None, None]:
+        """Handle delivery, free up the drone after delivery is complete."""
+        distance = (
+            self._get_distance_from_sorting_centre(station_id) * 2
+        )  # There and back
+        travel_time = distance / self._drones[drone_id].get_velocity()
+
+        if self._verbose:
+            print(
+                f"[t={round(self._env.now, 2)}] Drone '{drone_id}' is traveling... Estimated time: {travel_time:.2f}s"
+            )
+
+        package.set_delivery_time(self._env.now + (travel_time / 2))
+        collection_time = self._env.now + (travel_time / 2) + self._rng.uniform(5.0, 25.0)
+        if collection_time > package.get_expiration_time():
+            collection_time = None
+
+        self._publish_event(
+            SimulationEventTypes.DISPATCH, package.get_id(), station_id, drone_id
+        )
+
+        # Drone unavailable until it returns
+        yield from self._fly(
+            Flight(
+                drone_id,
+                package,
+                station_id,
+                self._env.now,
+                travel_time,
+                collection_time,
+            )
+        )
+
+    def _fly(self, flight: Flight) -> Generator[Timeout, None, None]:
+        """
+        Fly a drone to the station and back. Times are taken from the flight
+        record, so a flight restored from a snapshot resumes where it was.
+        """
+        drone_id, package, station_id = (
+            flight.drone_id,
+            flight.package,
+            flight.station_id,
+        )
+        self._flights[drone_id] = flight
+
+        if not flight.arrived:
+            yield self._env.timeout(
+                flight.departure_time + flight.travel_time / 2 - self._env.now
+            )
+            flight.arrived = True
+
+            station = self._package_stations[station_id]
+            try:
+                station.load_package(package)
+                flight.delivered = True
+            except ValueError:
+                flight.delivered = False
+
+            if flight.delivered:
+                # Logged only now, a trip that finds no free locker is no delivery
+                self._log_package(
+                    round(flight.departure_time, 2),
+                    package.get_id(),
+                    station_id,
+                    drone_id,
+                    round(package.get_delivery_time(), 2),
+                    package._postage_time,
+                    round(flight.collection_time, 2)
+                    if flight.collection_time is not None
+                    else None,
+                )
+                package.set_state(PackageStates.IN_PACKAGE_STATION)
+                if self._verbose:
+                    print(
+                        f"[t={round(self._env.now, 2)}] Package {package.get_id()} delivered to station {station_id}."
+                    )
+                self._publish_event(
+                    SimulationEventTypes.DELIVERY, package.get_id(), station_id, drone_id
+                )
+                self._env.process(
+                    self._collect_package(package, station_id, flight.collection_time)
+                )
+            else:
+                self._num_of_wasted_trips += 1
+                if self._verbose:
+                    print(
+                        f"[t={round(self._env.now, 2)}] No free locker for package {package.get_id()} at station {station_id}, flying it back."
+                    )
+
+        yield self._env.timeout(
+            flight.departure_time + flight.travel_time - self._env.now
+        )
+        del self._flights[drone_id]
+
+        if flight.retire:
+            del self._drones[drone_id]
+        elif self._drones[drone_id].remove_package():
+            if self._verbose:
+                print(
+                    f"[t={round(self._env.now, 2)}] Drone '{drone_id}' is available again."
+                )
+
+        if not flight.delivered:
+            package.set_state(PackageStates.IN_SORTING_PLANT)
+            self._packages_to_send_queue.appendleft(package)
+
+        self._dispatch_package()
+
+    def _collect_package(
+        self, package: Package, station_id: int, collection_time: Optional[float]
+    ) -> Generator[Timeout, None, None]:
+        """
+        Free the package's locker once it is collected, or once it expires
+        when it is not collected in time, and wake a package held for it.
+        """
+        self._pending_collections[package] = (
+            package,
+            station_id,
+            collection_time,
+        )
+        if collection_time is not None:
+            yield self._env.timeout(collection_time - self._env.now)
+            package.set_state(PackageStates.COLLECTED)
+            event_type = SimulationEventTypes.COLLECTION
+        else:
+            yield self._env.timeout(package.get_expiration_time() - self._env.now)
+            package.set_state(PackageStates.EXPIRED)
+            event_type = SimulationEventTypes.EXPIRATION
+
+        del self._pending_collections[package]
+        self._package_stations[station_id].remove_package(package)
+        self._publish_event(event_type, package.get_id(), station_id)
+        self._on_locker_freed(station_id)
+
+    def _publish_event(
+        self,
+        event_type: SimulationEventTypes,
+        package_id: int,
+        station_id: int,
+        drone_id: Optional[int] = None,
+    ) -> None:
+        """Publish an event on the event bus, if one is attached."""
+        if self._event_bus is None:
+            return
+        self._event_bus.publish(
+            SimulationEvent(event_type, self._env.now, package_id, station_id, drone_id)
+        )
+
+    def _log_package(
+        self,
+        time_of_dispatch: float,
+        package_id: int,
+        station_id: int,
+        drone_id: int,
+        delivery_time: float,
+        postage_time: float,
+        collection_time: Optional[None] = None,
+    ) -> None:
+        if self._delivery_log is None:
+            return
+        self._delivery_log.write(
+            time_of_dispatch,
+            package_id,
+            station_id,
+            drone_id,
+            delivery_time,
+            postage_time,
+            collection_time,
+        )
+
+
+class SortingOfficeNetwork:
+    """
+    Several sorting offices (hubs) seen as one: each package is routed to the
+    office its station was assigned to. Offers the same '_add_package' and
+    '_package_stations' as a single SortingOffice, so SystemEnvironment can
+    drive either.
+    """
+
+    def __init__(self, sorting_offices: Dict[int, SortingOffice]):
+        self._sorting_offices = sorting_offices
+        self._package_stations: Dict[int, PackageStation] = {}
+        self._office_of_station: Dict[int, SortingOffice] = {}
+        for sorting_office in sorting_offices.values():
+            for station_id, station in sorting_office._package_stations.items():
+                self._package_stations[station_id] = station
+                self._office_of_station[station_id] = sorting_office
+
+    def get_sorting_offices(self) -> Dict[int, SortingOffice]:
+        return self._sorting_offices
+
+    def get_num_of_held_packages(self) -> int:
+        return sum(o.get_num_of_held_packages() for o in self._sorting_offices.values())
+
+    def get_holding_time(self) -> float:
+        return sum(o.get_holding_time() for o in self._sorting_offices.values())
+
+    def get_num_of_wasted_trips(self) -> int:
+        return sum(o.get_num_of_wasted_trips() for o in self._sorting_offices.values())
+
+    def _add_package(self, package: Package) -> None:
+        """Hand the package over to the office serving its station."""
+        self._office_of_station[package.get_package_station_id()]._add_package(package)
+
+
+class SystemEnvironment:
+
+    def __init__(
+        self,
+        env: Environment,
+        sorting_office: SortingOffice,
+        random_time_lower_bound: int,
+        random_time_upper_bound: int,
+        rng: Optional[random.Random] = None,
+        arrival_time_scale: float = 1.0,
+    ):
+        self._env = env
+        self._sorting_office = sorting_office
+        self._random_time_lower_bound = random_time_lower_bound
+        self._random_time_upper_bound = random_time_upper_bound
+        # Stretches every gap between packages, e.g. for a shard of a scenario
+        self._arrival_time_scale = arrival_time_scale
+        self._rng = rng if rng is not None else random
+        self._next_package_id = 1
+        self._next_arrival_time: Optional[float] = None
+
+    def run_simulation(
+        self,
+        until: int = 50,
+        generate_packages: bool = True,
+        profiler: Optional[HandlerProfiler] = None,
+    ) -> None:
+        """
+        Run the simulation until the given time, generating random packages
+        unless generate_packages is False. With a profiler, the sorting office
+        handlers are timed for the duration of the run.
+        """
+        def add_and_send_packages() -> Generator[Process | Timeout, None, None]:
+            # A run resumed from a snapshot first waits for the pending arrival
+            if self._next_arrival_time is not None:
+                yield self._env.timeout(
+                    max(self._next_arrival_time - self._env.now, 0)
+                )
+            while True:
+                station: PackageStation = self._rng.choice(
+                    list(self._sorting_office._package_stations.values())
+                )
+                package = Package(self._next_package_id, station.get_id())
+                package._postage_time = self._env.now
+                self._sorting_office._add_package(package)
+
+                self._next_package_id += 1
+
+                # Wait a random amount of time between each package
+                delay = (
+                    self._rng.randint(
+                        self._random_time_lower_bound, self._random_time_upper_bound
+                    )
+                    * self._arrival_time_scale
+                )
+
+                self._next_arrival_time = self._env.now + delay
+                yield self._env.timeout(delay)
+
+        if profiler is None:
+            if generate_packages:
+                self._env.process(add_and_send_packages())
+            self._env.run(until=until)
+            return
+
+        profiler.attach(self._sorting_office)
+        profiler.attach_environment(self._env)
+        try:
+            if generate_packages:
+                self._env.process(
+                    profiler.timed_generator(
+                        "add_and_send_packages", add_and_send_packages()
+                    )
+                )
+            profiler.run(lambda: self._env.run(until=until))
+        finally:
+            profiler.detach()
+
+
+def build_domain_objects(
+    config: dict,
+) -> Tuple[Dict[int, Drone], Dict[int, PackageStation]]:
+    """Create the drones and package stations described by a loaded config."""
+    drones = {}
+    for d in config.get("drones", []):
+        drone_id = d["id"]
+        velocity = d["velocity"]
+        drones[drone_id] = Drone(drone_id, velocity)
+
+    stations = {}
+    for s in config.get("package_stations", []):
+        station_id = s["id"]
+        position = Position(tuple(s["position"])[0], tuple(s["position"])[1])
+        lockers = s["lockers"]
+        stations[station_id] = PackageStation(station_id, position, lockers)
+
+    return drones, stations
+
+
+def build_sorting_offices(
+    env: Environment,
+    config: dict,
+    drones: Dict[int, Drone],
+    stations: Dict[int, PackageStation],
+    event_bus: Optional[EventBus] = None,
+    csv_filename: Optional[Path] = Path("package_deliveries.csv"),
+    delivery_log: Optional[DeliveryLog] = None,
+    rng: Optional[random.Random] = None,
+    verbose: bool = True,
+    locker_admission: bool = True,
+) -> Union[SortingOffice, SortingOfficeNetwork]:
+    """
+    Create the sorting office of the config, or a network of them when it
+    declares several. All offices write to the same delivery log, given
+    either as delivery_log or as the csv_filename of a new DeliveryLog.
+    """
+    if delivery_log is None and csv_filename is not None:
+        delivery_log = DeliveryLog(csv_filename)
+    assignment = assign_to_sorting_offices(config, drones, stations)
+
+    sorting_offices = {
+        office_id: SortingOffice(
+            env,
+            office_drones,
+            office_stations,
+            event_bus=event_bus,
+            csv_filename=None,
+            position=position,
+            delivery_log=delivery_log,
+            rng=rng,
+            verbose=verbose,
+            locker_admission=locker_admission,
+        )
+        for office_id, (position, office_drones, office_stations) in assignment.items()
+    }
+    if len(sorting_offices) == 1:
+        return next(iter(sorting_offices.values()))
+    return SortingOfficeNetwork(sorting_offices)
+
+
+def simulate(
+    config: dict,
+    until: float = 200,
+    random_time_lb: int = 10,
+    random_time_ub: int = 20,
+    seed: Optional[int] = None,
+    orders: Optional[Iterator[Tuple[float, int]]] = None,
+    locker_admission: bool = True,
+    with_metrics: bool = False,
+    arrival_time_scale: float = 1.0,
+) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, float]]]:
+    """
+    Run a simulation as fast as possible, without realtime pacing, printing
+    or file I/O, and return the deliveries as a structured array with the
+    fields of DeliveryRecorder.DTYPE.
+
+    'config' is a loaded config dict (see config_loader.load_config). Packages
+    are generated randomly between random_time_lb and random_time_ub seconds
+    apart (times arrival_time_scale), or taken from 'orders', an iterator of
+    (time, station_id) such as arrivals.read_order_trace. The same seed
+    gives the same result.
+    locker_admission is passed on to the sorting offices.
+
+    With with_metrics, returns (deliveries, metrics) where metrics holds the
+    offices' counters: held_packages, holding_time and wasted_trips.
+    """
+    env = Environment()
+    rng = random.Random(seed)
+    recorder = DeliveryRecorder()
+
+    drones, stations = build_domain_objects(config)
+    sorting_office = build_sorting_offices(
+        env,
+        config,
+        drones,
+        stations,
+        csv_filename=None,
+        delivery_log=recorder,
+        rng=rng,
+        verbose=False,
+        locker_admission=locker_admission,
+    )
+    system = SystemEnvironment(
+        env,
+        sorting_office,
+        random_time_lb,
+        random_time_ub,
+        rng=rng,
+        arrival_time_scale=arrival_time_scale,
+    )
+    if orders is not None:
+        env.process(replay_orders(env, sorting_office, orders))
+    system.run_simulation(until=until, generate_packages=orders is None)
+
+    if not with_metrics:
+        return recorder.to_array()
+    metrics = {
+        "held_packages": sorting_office.get_num_of_held_packages(),
+        "holding_time": sorting_office.get_holding_time(),
+        "wasted_trips": sorting_office.get_num_of_wasted_trips(),
+    }
+    return recorder.to_array(), metrics
@@ -0,0 +1,504 @@
+import copy
+import os
+import pickle
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Generator, List, Optional, Tuple, Union
+
+import numpy as np
+import typer
+from config_loader import load_config
+from delivery_log import DeliveryRecorder
+from drone import Drone
+from package import Package
+from sharding import write_deliveries_csv
+from simpy import Environment, Timeout
+from simulation import (
+    Flight,
+    SortingOffice,
+    SortingOfficeNetwork,
+    SystemEnvironment,
+    build_domain_objects,
+    build_sorting_offices,
+    simulate,
+)
+
+
+class ScenarioSnapshot:
+    """
+    Logical state of a scenario at simulation time T, enough to continue it
+    in a fresh Environment: queued and held packages, drone flights, locker
+    contents, packages waiting for collection, the next random arrival and
+    the RNG state. SimPy processes cannot be pickled, so they are recreated
+    from this state by fork(); the snapshot itself pickles (and so crosses
+    process boundaries) as a whole, keeping Package objects shared between
+    a flight, a locker and a queue identical.
+
+    The deliveries and metrics of the warm-up up to T are kept alongside.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        time: float,
+        rng_state: tuple,
+        next_package_id: int,
+        next_arrival_time: Optional[float],
+        random_time_lb: int,
+        random_time_ub: int,
+        locker_admission: bool,
+        send_queue: List[Package],
+        holding_queues: Dict[int, List[Tuple[Package, float]]],
+        flights: List[Flight],
+        lockers: Dict[int, List[Tuple[str, Package]]],
+        pending_collections: List[Tuple[Package, int, Optional[float]]],
+        deliveries: np.ndarray,
+        metrics: Dict[str, float],
+    ):
+        self.config = config
+        self.time = time
+        self.rng_state = rng_state
+        self.next_package_id = next_package_id
+        self.next_arrival_time = next_arrival_time
+        self.random_time_lb = random_time_lb
+        self.random_time_ub = random_time_ub
+        self.locker_admission = locker_admission
+        self.send_queue = send_queue
+        self.holding_queues = holding_queues
+        self.flights = flights
+        self.lockers = lockers
+        self.pending_collections = pending_collections
+        self.deliveries = deliveries
+        self.metrics = metrics
+
+    def save(self, filename: Path) -> None:
+        with open(filename, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(filename: Path) -> "ScenarioSnapshot":
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+
+
+def _get_offices(
+    sorting_office: Union[SortingOffice, SortingOfficeNetwork]
+) -> List[SortingOffice]:
+    if isinstance(sorting_office, SortingOfficeNetwork):
+        return list(sorting_office.get_sorting_offices().values())
+    return [sorting_office]
+
+
+def _get_metrics(
+    sorting_office: Union[SortingOffice, SortingOfficeNetwork]
+) -> Dict[str, float]:
+    return {
+        "held_packages": sorting_office.get_num_of_held_packages(),
+        "holding_time": sorting_office.get_holding_time(),
+        "wasted_trips": sorting_office.get_num_of_wasted_trips(),
+    }
+
+
+def take_snapshot(
+    config: dict,
+    system: SystemEnvironment,
+    sorting_office: Union[SortingOffice, SortingOfficeNetwork],
+    rng: random.Random,
+    recorder: DeliveryRecorder,
+) -> ScenarioSnapshot:
+    """Capture a simulation stopped by env.run(until=T)."""
+    send_queue, holding_queues, flights = [], {}, []
+    lockers, pending_collections = {}, []
+    for office in _get_offices(sorting_office):
+        send_queue += office._packages_to_send_queue
+        for station_id, holding_queue in office._holding_queues.items():
+            if holding_queue:
+                holding_queues[station_id] = list(holding_queue)
+        flights += office._flights.values()
+        pending_collections += office._pending_collections.values()
+        for station_id, station in office._package_stations.items():
+            # Stations whose lockers were never created hold nothing
+            if station._locker is None:
+                continue
+            contents = [
+                (locker.get_state().value, locker.get_package())
+                for locker in station._locker
+                if locker.get_package() is not None
+            ]
+            if contents:
+                lockers[station_id] = contents
+
+    return ScenarioSnapshot(
+        config=config,
+        time=system._env.now,
+        rng_state=rng.getstate(),
+        next_package_id=system._next_package_id,
+        next_arrival_time=system._next_arrival_time,
+        random_time_lb=system._random_time_lower_bound,
+        random_time_ub=system._random_time_upper_bound,
+        locker_admission=_get_offices(sorting_office)[0]._locker_admission,
+        send_queue=send_queue,
+        holding_queues=holding_queues,
+        flights=flights,
+        lockers=lockers,
+        pending_collections=pending_collections,
+        deliveries=recorder.to_array(),
+        metrics=_get_metrics(sorting_office),
+    )
+
+
+def warm_up(
+    config: dict,
+    until: float,
+    random_time_lb: int = 10,
+    random_time_ub: int = 20,
+    seed: Optional[int] = None,
+    locker_admission: bool = True,
+) -> ScenarioSnapshot:
+    """
+    Simulate the config up to time 'until', as simulation.simulate() does,
+    and return a snapshot of the scenario at that time.
+    """
+    env = Environment()
+    rng = random.Random(seed)
+    recorder = DeliveryRecorder()
+
+    drones, stations = build_domain_objects(config)
+    sorting_office = build_sorting_offices(
+        env,
+        config,
+        drones,
+        stations,
+        csv_filename=None,
+        delivery_log=recorder,
+        rng=rng,
+        verbose=False,
+        locker_admission=locker_admission,
+    )
+    system = SystemEnvironment(
+        env, sorting_office, random_time_lb, random_time_ub, rng=rng
+    )
+    system.run_simulation(until=until)
+    return take_snapshot(config, system, sorting_office, rng, recorder)
+
+
+def fork(
+    snapshot: ScenarioSnapshot,
+    until: float,
+    config: Optional[dict] = None,
+    locker_admission: Optional[bool] = None,
+    random_time_lb: Optional[int] = None,
+    random_time_ub: Optional[int] = None,
+    seed: Optional[int] = None,
+    with_metrics: bool = False,
+) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, float]]]:
+    """
+    Continue the snapshot's scenario from its time T up to time 'until' and
+    return the deliveries made after T, like simulation.simulate().
+    The snapshot itself is left untouched, so it can be forked many times.
+
+    Every other argument overrides the warm-up's setting for this branch.
+    A different config (e.g. another fleet size) must still contain the
+    stations of the snapshot; in-flight drones it leaves out finish their
+    trip and then retire. Without a seed the branch
+    carries on with the warm-up's RNG state, so forking with no overrides
+    continues the warm-up exactly. Metrics only count what happens after T.
+    """
+    snapshot = copy.deepcopy(snapshot)
+    if config is None:
+        config = snapshot.config
+    if locker_admission is None:
+        locker_admission = snapshot.locker_admission
+    if random_time_lb is None:
+        random_time_lb = snapshot.random_time_lb
+    if random_time_ub is None:
+        random_time_ub = snapshot.random_time_ub
+
+    env = Environment(initial_time=snapshot.time)
+    rng = random.Random(seed)
+    if seed is None:
+        rng.setstate(snapshot.rng_state)
+    recorder = DeliveryRecorder()
+
+    drones, stations = build_domain_objects(config)
+    sorting_office = build_sorting_offices(
+        env,
+        config,
+        drones,
+        stations,
+        csv_filename=None,
+        delivery_log=recorder,
+        rng=rng,
+        verbose=False,
+        locker_admission=locker_admission,
+    )
+    office_of_station = {}
+    for office in _get_offices(sorting_office):
+        for station_id in office._package_stations:
+            office_of_station[station_id] = office
+
+    def get_office(station_id: int) -> SortingOffice:
+        if station_id not in office_of_station:
+            raise ValueError(
+                f"Station {station_id} of the snapshot is not in the config"
+            )
+        return office_of_station[station_id]
+
+    for station_id, contents in snapshot.lockers.items():
+        station = get_office(station_id)._package_stations[station_id]
+        for state, package in contents:
+            if state == "RESERVED":
+                loaded = station.reserve_locker(package)
+            else:
+                loaded = station.get_num_of_free_lockers() > 0
+                if loaded:
+                    station.load_package(package)
+            if not loaded:
+                raise ValueError(
+                    f"Station {station_id} has too few lockers for the snapshot"
+                )
+
+    for package in snapshot.send_queue:
+        get_office(package.get_package_station_id())._packages_to_send_queue.append(
+            package
+        )
+    for station_id, holding_queue in snapshot.holding_queues.items():
+        get_office(station_id)._holding_queues[station_id] = deque(holding_queue)
+
+    drone_offices = {
+        drone_id: office
+        for office in _get_offices(sorting_office)
+        for drone_id in office._drones
+    }
+    velocities = {d["id"]: d["velocity"] for d in snapshot.config["drones"]}
+    for flight in snapshot.flights:
+        office = get_office(flight.station_id)
+        drone_id = flight.drone_id
+        if drone_id not in office._drones:
+            # The drone is not in this office's fleet any more: a stand-in
+            # finishes the trip and retires, and a drone of the same id moved
+            # to another office stays busy until the trip would have ended
+            office._drones[drone_id] = Drone(drone_id, velocities[drone_id])
+            flight.retire = True
+            if drone_id in drone_offices:
+                drone_offices[drone_id]._drones[drone_id].load_package(flight.package)
+                env.process(
+                    _hold_drone(
+                        drone_offices[drone_id],
+                        drone_id,
+                        flight.departure_time + flight.travel_time,
+                    )
+                )
+        office._drones[drone_id].load_package(flight.package)
+        env.process(office._fly(flight))
+
+    for package, station_id, collection_time in snapshot.pending_collections:
+        env.process(
+            get_office(station_id)._collect_package(package, station_id, collection_time)
+        )
+
+    # Queued packages left behind by a smaller fleet go out now
+    for office in _get_offices(sorting_office):
+        office._dispatch_package()
+
+    system = SystemEnvironment(
+        env, sorting_office, random_time_lb, random_time_ub, rng=rng
+    )
+    system._next_package_id = snapshot.next_package_id
+    system._next_arrival_time = snapshot.next_arrival_time
+    system.run_simulation(until=until)
+
+    if not with_metrics:
+        return recorder.to_array()
+    return recorder.to_array(), _get_metrics(sorting_office)
+
+
+def _hold_drone(
+    office: SortingOffice, drone_id: int, until: float
+) -> Generator[Timeout, None, None]:
+    """Make a drone loaded by fork() available at its office at 'until'."""
+    yield office._env.timeout(until - office._env.now)
+    office._drones[drone_id].remove_package()
+    office._dispatch_package()
+
+
+def _run_fork(args: Tuple[ScenarioSnapshot, float, dict]):
+    snapshot, until, options = args
+    return fork(snapshot, until, with_metrics=True, **options)
+
+
+def fork_many(
+    snapshot: ScenarioSnapshot,
+    until: float,
+    variants: List[dict],
+    max_workers: Optional[int] = None,
+) -> List[Tuple[np.ndarray, Dict[str, float]]]:
+    """
+    Fork one continuation per variant in parallel processes. Each variant is
+    a dict of fork() overrides (config, locker_admission, random_time_lb,
+    random_time_ub, seed); returns (deliveries, metrics) per variant.
+    """
+    jobs = [(snapshot, until, variant) for variant in variants]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_run_fork, jobs))
+
+
+def _same_deliveries(a: np.ndarray, b: np.ndarray) -> bool:
+    return a.size == b.size and all(
+        np.array_equal(a[name], b[name], equal_nan=True) for name in a.dtype.names
+    )
+
+
+def check_continuation(
+    config: dict,
+    until: float,
+    snapshot_time: float,
+    random_time_lb: int = 10,
+    random_time_ub: int = 20,
+    seed: int = 0,
+    locker_admission: bool = True,
+) -> bool:
+    """
+    Check that warming up to snapshot_time and forking (also after a pickle
+    round trip) to 'until' delivers exactly what simulate() does in one go.
+    """
+    options = {
+        "random_time_lb": random_time_lb,
+        "random_time_ub": random_time_ub,
+        "seed": seed,
+        "locker_admission": locker_admission,
+    }
+    direct = simulate(config, until=until, **options)
+    snapshot = warm_up(config, snapshot_time, **options)
+    for branch in (snapshot, pickle.loads(pickle.dumps(snapshot))):
+        continued = np.concatenate([snapshot.deliveries, fork(branch, until)])
+        if not _same_deliveries(direct, continued):
+            return False
+    return True
+
+
+app = typer.Typer()
+
+
+@app.command("warm-up")
+def warm_up_command(
+    config_file: Path = typer.Argument(..., help="Path to the YAML or NPZ config file."),
+    until: int = typer.Option(..., help="Simulation time of the snapshot."),
+    random_time_ub: int = typer.Option(
+        20, help="Upper bound of randomized package generation."
+    ),
+    random_time_lb: int = typer.Option(
+        10, help="Lower bound of randomized package generation."
+    ),
+    seed: Optional[int] = typer.Option(None, help="Random seed of the warm-up."),
+    locker_admission: bool = typer.Option(
+        True, help="Reserve a locker before dispatching a drone."
+    ),
+    snapshot_file: Path = typer.Option(
+        Path("scenario.snapshot"), help="File to write the snapshot to."
+    ),
+):
+    """Simulate CONFIG_FILE up to UNTIL and save a snapshot of the scenario."""
+    snapshot = warm_up(
+        load_config(config_file),
+        until,
+        random_time_lb=random_time_lb,
+        random_time_ub=random_time_ub,
+        seed=seed,
+        locker_admission=locker_admission,
+    )
+    snapshot.save(snapshot_file)
+    typer.echo(
+        f"Snapshot at t={snapshot.time} written to '{snapshot_file}': "
+        f"{len(snapshot.send_queue)} queued, {len(snapshot.flights)} in flight, "
+        f"{len(snapshot.pending_collections)} awaiting collection."
+    )
+
+
+@app.command("fork")
+def fork_command(
+    snapshot_file: Path = typer.Argument(..., help="Snapshot written by warm-up."),
+    config_files: Optional[List[Path]] = typer.Argument(
+        None, help="Config of each branch; one branch on the snapshot's config if none."
+    ),
+    until: int = typer.Option(..., help="Simulation time to continue to."),
+    seed: Optional[int] = typer.Option(
+        None, help="Random seed of the first branch, else continue the warm-up's RNG."
+    ),
+    locker_admission: Optional[bool] = typer.Option(
+        None, help="Override the warm-up's locker admission."
+    ),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Number of processes."),
+    output_prefix: str = typer.Option(
+        "package_deliveries", help="Branch i writes '<prefix>_<i>.csv'."
+    ),
+):
+    """Continue SNAPSHOT_FILE once per config in parallel processes."""
+    snapshot = ScenarioSnapshot.load(snapshot_file)
+    configs = [load_config(c) for c in config_files] if config_files else [None]
+    variants = [
+        {
+            "config": config,
+            "locker_admission": locker_admission,
+            "seed": None if seed is None else seed + i,
+        }
+        for i, config in enumerate(configs)
+    ]
+    results = fork_many(snapshot, until, variants, max_workers=workers)
+
+    for i, (deliveries, metrics) in enumerate(results):
+        output_file = Path(f"{output_prefix}_{i}.csv")
+        write_deliveries_csv(output_file, deliveries)
+        typer.echo(
+            f"Branch {i}: {deliveries.size} deliveries written to '{output_file}', "
+            f"held packages {metrics['held_packages']}, "
+            f"holding time {metrics['holding_time']:.1f}s, "
+            f"wasted trips {metrics['wasted_trips']}."
+        )
+
+
+@app.command("check")
+def check_command(
+    config_file: Path = typer.Argument(..., help="Path to the YAML or NPZ config file."),
+    until: int = typer.Option(2000, help="Simulation time to run to."),
+    snapshot_time: int = typer.Option(1000, help="Simulation time of the snapshot."),
+    random_time_ub: int = typer.Option(
+        20, help="Upper bound of randomized package generation."
+    ),
+    random_time_lb: int = typer.Option(
+        10, help="Lower bound of randomized package generation."
+    ),
+    seed: int = typer.Option(0, help="Random seed."),
+):
+    """
+    Check that warm-up plus fork reproduces an uninterrupted run of
+    CONFIG_FILE, with and without locker admission.
+    """
+    ok = True
+    for locker_admission in (True, False):
+        same = check_continuation(
+            load_config(config_file),
+            until,
+            snapshot_time,
+            random_time_lb=random_time_lb,
+            random_time_ub=random_time_ub,
+            seed=seed,
+            locker_admission=locker_admission,
+        )
+        typer.echo(
+            f"locker admission {'on' if locker_admission else 'off'}: "
+            f"{'identical' if same else 'DIFFERENT'}"
+        )
+        ok &= same
+    if not ok:
+        raise typer.Exit(code=1)
+
+
+def main():
+    app()
+
+
+if __name__ == "__main__":
+    main()
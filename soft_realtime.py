@@ -0,0 +1,165 @@
+from bisect import bisect_right
+from time import monotonic, sleep
+from typing import List, Optional
+
+from simpy.core import EmptySchedule, Environment, Infinity, SimTime
+from simpy.rt import RealtimeEnvironment
+
+
+class LagMonitor:
+    """
+    Collects how late events fire compared with their scheduled wall-clock
+    time, and how fast the control loop processes them.
+
+    Wall time is cut into windows; a window in which an event was later than
+    'lag_threshold' counts as falling behind. The event rates of windows that
+    kept up and of windows that fell behind bracket the sustained rate at
+    which the loop stops keeping up.
+    """
+
+    # Upper edges of the lag histogram buckets, in seconds
+    BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+    def __init__(self, lag_threshold: float = 0.1, window: float = 1.0):
+        self._lag_threshold = lag_threshold
+        self._window = window
+
+        self._histogram: List[int] = [0] * (len(LagMonitor.BUCKETS) + 1)
+        self._max_lag = 0.0
+        self._events = 0
+        self._processing_time = 0.0
+        self._slipped_time = 0.0
+
+        self._window_start: Optional[float] = None
+        self._window_events = 0
+        self._window_behind = False
+        self._max_rate_keeping_up = 0.0
+        self._min_rate_behind = float("inf")
+
+    def record(self, lag: float, processing_time: float) -> None:
+        """Record one event that fired 'lag' seconds late."""
+        lag = max(lag, 0.0)
+        self._histogram[bisect_right(LagMonitor.BUCKETS, lag)] += 1
+        self._max_lag = max(self._max_lag, lag)
+        self._events += 1
+        self._processing_time += processing_time
+
+        now = monotonic()
+        if self._window_start is None:
+            self._window_start = now
+        self._window_events += 1
+        self._window_behind |= lag > self._lag_threshold
+
+        if now - self._window_start >= self._window:
+            self._close_window(now)
+
+    def _close_window(self, now: float) -> None:
+        elapsed = now - self._window_start
+        if self._window_events and elapsed > 0:
+            rate = self._window_events / elapsed
+            if self._window_behind:
+                self._min_rate_behind = min(self._min_rate_behind, rate)
+            else:
+                self._max_rate_keeping_up = max(self._max_rate_keeping_up, rate)
+        self._window_start = now
+        self._window_events = 0
+        self._window_behind = False
+
+    def flush(self) -> None:
+        """Close the current, partial window so its rate is counted too."""
+        if self._window_start is not None:
+            self._close_window(monotonic())
+
+    def record_slip(self, slip: float) -> None:
+        """Record wall-clock time given up to stay within the lag budget."""
+        self._slipped_time += slip
+
+    def get_histogram(self) -> List[int]:
+        """Event counts per bucket; the last bucket holds lags above 5 s."""
+        return self._histogram
+
+    def get_max_lag(self) -> float:
+        return self._max_lag
+
+    def get_num_of_events(self) -> int:
+        return self._events
+
+    def get_slipped_time(self) -> float:
+        return self._slipped_time
+
+    def get_capacity(self) -> float:
+        """Events per second the loop could handle with no sleeping at all."""
+        if self._processing_time == 0:
+            return float("inf")
+        return self._events / self._processing_time
+
+    def report(self) -> str:
+        self.flush()
+        lines = [f"Events: {self._events}, max lag: {self._max_lag * 1000:.1f} ms"]
+        lower = 0.0
+        for upper, count in zip(LagMonitor.BUCKETS + (float("inf"),), self._histogram):
+            if count:
+                lines.append(
+                    f"  {lower * 1000:>7.0f} - {upper * 1000:>7.0f} ms: {count}"
+                )
+            lower = upper
+        lines.append(f"Wall-clock time slipped: {self._slipped_time:.3f} s")
+        lines.append(f"Processing capacity: {self.get_capacity():.0f} events/s")
+        # Every closed window holds at least one event, so 0 means none kept up
+        if self._max_rate_keeping_up > 0:
+            lines.append(
+                f"Highest rate keeping up: {self._max_rate_keeping_up:.1f} events/s"
+            )
+        if self._min_rate_behind != float("inf"):
+            lines.append(
+                f"Lowest rate falling behind: {self._min_rate_behind:.1f} events/s"
+            )
+        return "\n".join(lines)
+
+
+class SoftRealtimeEnvironment(RealtimeEnvironment):
+    """
+    Realtime environment that never raises for being slow. Overdue events are
+    processed back to back, without sleeping, until the simulation has caught
+    up. If an event is more than 'lag_budget' seconds late, the wall-clock
+    anchor is moved forward so the lag never exceeds the budget, i.e. the
+    simulation slips instead of bursting through an ever growing backlog.
+    """
+
+    def __init__(
+        self,
+        initial_time: SimTime = 0,
+        factor: float = 1.0,
+        lag_budget: float = 0.5,
+        monitor: Optional[LagMonitor] = None,
+    ):
+        super().__init__(initial_time, factor, strict=False)
+        self._lag_budget = lag_budget
+        self._monitor = monitor if monitor is not None else LagMonitor()
+
+    def get_monitor(self) -> LagMonitor:
+        return self._monitor
+
+    def step(self) -> None:
+        evt_time = self.peek()
+
+        if evt_time is Infinity:
+            raise EmptySchedule
+
+        real_time = self.real_start + (evt_time - self.env_start) * self.factor
+
+        while True:
+            delta = real_time - monotonic()
+            if delta <= 0:
+                break
+            sleep(delta)
+
+        lag = monotonic() - real_time
+        if lag > self._lag_budget:
+            slip = lag - self._lag_budget
+            self.real_start += slip
+            self._monitor.record_slip(slip)
+
+        start = monotonic()
+        Environment.step(self)
+        self._monitor.record(lag, monotonic() - start)
@@ -0,0 +1,262 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def nearest_brute_force(points: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    Return the index of the closest of 'points' for each of 'queries',
+    computing the distance matrix in blocks of about 4M entries.
+    """
+    nearest = np.empty(len(queries), dtype=np.int64)
+    rows = max(1, (1 << 22) // len(points))
+    for start in range(0, len(queries), rows):
+        block = queries[start : start + rows]
+        distances = np.hypot(
+            block[:, None, 0] - points[None, :, 0],
+            block[:, None, 1] - points[None, :, 1],
+        )
+        nearest[start : start + len(block)] = distances.argmin(axis=1)
+    return nearest
+
+
+class GridIndex:
+    """
+    Uniform grid over a set of 2D points for nearest-neighbour queries.
+    Points are bucketed into square cells; a query scans rings of cells
+    around its own cell and stops as soon as no unvisited ring can hold a
+    closer point, so it only looks at a handful of cells on average.
+    Queries needing more than MAX_RINGS rings, or more rings than would pay
+    off against scanning all points, scan all points instead, which bounds
+    the cost of any single query.
+
+    nearest_many() walks the rings of all query points together with NumPy
+    rather than one query at a time, and starts queries outside the grid
+    from its nearest cell.
+    """
+
+    MAX_RINGS = 16
+
+    def __init__(
+        self,
+        ids: Sequence[int],
+        points: Sequence[Tuple[float, float]],
+        cell_size: Optional[float] = None,
+    ):
+        self._ids = np.asarray(ids)
+        self._points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self._points.shape[0] == 0:
+            raise ValueError("GridIndex needs at least one point")
+
+        self._origin = self._points.min(axis=0)
+        extent = self._points.max(axis=0) - self._origin
+        if cell_size is None:
+            # About one point per cell
+            area = max(extent[0], 1.0) * max(extent[1], 1.0)
+            cell_size = math.sqrt(area / self._points.shape[0])
+        self._cell_size = max(cell_size, 1e-9)
+        self._num_cells = (
+            np.floor(extent / self._cell_size).astype(np.int64) + 1
+        ).tolist()
+
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, cell in enumerate(self._cell_of(self._points).tolist()):
+            self._cells.setdefault(tuple(cell), []).append(i)
+
+        # The same buckets as flat arrays: the points of cell c (numbered
+        # x * ny + y) are _by_cell[_cell_start[c] : _cell_start[c] + _cell_count[c]]
+        cells = self._cell_of(self._points)
+        flat = cells[:, 0] * self._num_cells[1] + cells[:, 1]
+        self._by_cell = np.argsort(flat, kind="stable")
+        self._cell_count = np.bincount(
+            flat, minlength=self._num_cells[0] * self._num_cells[1]
+        )
+        self._cell_start = np.cumsum(self._cell_count) - self._cell_count
+        # Ring r visits about 8r points; stop once that nears a full scan
+        self._max_rings = min(
+            GridIndex.MAX_RINGS, max(1, self._points.shape[0] // 32)
+        )
+
+    def _cell_of(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points - self._origin) / self._cell_size).astype(np.int64)
+
+    def _ring(self, cx: int, cy: int, r: int):
+        """Cells of the ring at Chebyshev distance r that lie on the grid."""
+        if r == 0:
+            yield cx, cy
+            return
+        nx, ny = self._num_cells
+        x_lo, x_hi = max(cx - r, 0), min(cx + r, nx - 1)
+        y_lo, y_hi = max(cy - r + 1, 0), min(cy + r - 1, ny - 1)
+        for y in (cy - r, cy + r):
+            if 0 <= y < ny:
+                for x in range(x_lo, x_hi + 1):
+                    yield x, y
+        for x in (cx - r, cx + r):
+            if 0 <= x < nx:
+                for y in range(y_lo, y_hi + 1):
+                    yield x, y
+
+    def nearest(self, x: float, y: float) -> Tuple[int, float]:
+        """Return (id, distance) of the point closest to (x, y)."""
+        cx, cy = self._cell_of(np.array([x, y])).tolist()
+        nx, ny = self._num_cells
+        # Rings closer than this miss the grid, rings beyond the other
+        # cannot contain any point of it
+        min_ring = max(-cx, cx - nx + 1, -cy, cy - ny + 1, 0)
+        max_ring = max(abs(cx), abs(cy), abs(cx - nx + 1), abs(cy - ny + 1))
+        if min_ring > 0:
+            return self._scan(x, y)
+
+        best_index, best_distance = -1, float("inf")
+        for r in range(max_ring + 1):
+            if r > GridIndex.MAX_RINGS:
+                return self._scan(x, y)
+            for cell in self._ring(cx, cy, r):
+                for i in self._cells.get(cell, ()):
+                    px, py = self._points[i]
+                    distance = math.hypot(px - x, py - y)
+                    if distance < best_distance:
+                        best_index, best_distance = i, distance
+            # Any point in ring r + 1 is at least r cells away
+            if best_distance <= r * self._cell_size:
+                break
+
+        return self._ids[best_index].item(), best_distance
+
+    def _scan(self, x: float, y: float) -> Tuple[int, float]:
+        distances = np.hypot(self._points[:, 0] - x, self._points[:, 1] - y)
+        best_index = int(distances.argmin())
+        return self._ids[best_index].item(), distances[best_index].item()
+
+    @staticmethod
+    def _ring_offsets(r: int) -> np.ndarray:
+        """(dx, dy) of the cells at Chebyshev distance r, shape (8r or 1, 2)."""
+        if r == 0:
+            return np.zeros((1, 2), dtype=np.int64)
+        side = np.arange(-r, r + 1)
+        inner = np.arange(-r + 1, r)
+        return np.concatenate(
+            [
+                np.stack([side, np.full_like(side, -r)], axis=1),
+                np.stack([side, np.full_like(side, r)], axis=1),
+                np.stack([np.full_like(inner, -r), inner], axis=1),
+                np.stack([np.full_like(inner, r), inner], axis=1),
+            ]
+        )
+
+    def _unvisited_distance(
+        self, queries: np.ndarray, cells: np.ndarray, gap: np.ndarray, r: int
+    ) -> np.ndarray:
+        """
+        Lower bound on the distance from each query to the grid cells not
+        within r rings of its start cell, inf when every cell was visited.
+        """
+        num_cells = np.array(self._num_cells)
+        low = self._origin + (cells - r) * self._cell_size
+        high = self._origin + (cells + r + 1) * self._cell_size
+        # Along axis a the cells left lie below 'low' or above 'high'; they
+        # are also at least the other axis' gap away
+        other_gap = gap[:, ::-1]
+        below = np.where(cells - r > 0, np.hypot(queries - low, other_gap), np.inf)
+        above = np.where(
+            cells + r + 1 < num_cells, np.hypot(high - queries, other_gap), np.inf
+        )
+        return np.minimum(below, above).min(axis=1)
+
+    def nearest_many(self, points: Sequence[Tuple[float, float]]) -> np.ndarray:
+        """Return the id of the closest indexed point for each query point."""
+        queries = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        nx, ny = self._num_cells
+        # Points outside the grid start from the nearest cell on it
+        cells = np.clip(self._cell_of(queries), 0, [nx - 1, ny - 1])
+        # How far each query lies outside the grid along each axis
+        grid_end = self._origin + np.array([nx, ny]) * self._cell_size
+        gap = np.maximum(np.maximum(self._origin - queries, queries - grid_end), 0)
+
+        best_index = np.full(len(queries), -1, dtype=np.int64)
+        best_distance = np.full(len(queries), np.inf)
+        active = np.arange(len(queries))
+        for r in range(self._max_rings + 1):
+            if active.size == 0:
+                break
+            offsets = GridIndex._ring_offsets(r)
+            ring = cells[active][:, None, :] + offsets[None, :, :]
+            on_grid = (
+                (ring[..., 0] >= 0)
+                & (ring[..., 0] < nx)
+                & (ring[..., 1] >= 0)
+                & (ring[..., 1] < ny)
+            )
+            query = np.broadcast_to(active[:, None], on_grid.shape)[on_grid]
+            ring = ring[on_grid]
+            flat = ring[:, 0] * ny + ring[:, 1]
+
+            # One (query, point) pair per point in each visited cell
+            counts = self._cell_count[flat]
+            query = np.repeat(query, counts)
+            first = np.cumsum(counts) - counts
+            within = np.arange(counts.sum()) - np.repeat(first, counts)
+            point = self._by_cell[np.repeat(self._cell_start[flat], counts) + within]
+
+            if point.size:
+                distance = np.hypot(
+                    self._points[point, 0] - queries[query, 0],
+                    self._points[point, 1] - queries[query, 1],
+                )
+                # Pairs come grouped by query; keep the closest of each group
+                starts = np.flatnonzero(np.r_[True, query[1:] != query[:-1]])
+                group_min = np.minimum.reduceat(distance, starts)
+                sizes = np.diff(np.r_[starts, distance.size])
+                is_min = distance == np.repeat(group_min, sizes)
+                query, point, distance = query[is_min], point[is_min], distance[is_min]
+                head = np.r_[True, query[1:] != query[:-1]]
+                query, point, distance = query[head], point[head], distance[head]
+                closer = distance < best_distance[query]
+                best_index[query[closer]] = point[closer]
+                best_distance[query[closer]] = distance[closer]
+
+            active = active[
+                best_distance[active] > self._unvisited_distance(
+                    queries[active], cells[active], gap[active], r
+                )
+            ]
+
+        if active.size:
+            best_index[active] = nearest_brute_force(self._points, queries[active])
+        return self._ids[best_index]
+
+
+def check_against_brute_force(
+    num_points: int, num_queries: int = 20000, seed: int = 0
+) -> bool:
+    """
+    Check GridIndex.nearest_many against nearest_brute_force on random
+    uniform, clustered and collinear points, with queries partly outside
+    the points' area. Ties may pick different points at the same distance.
+    """
+    rng = np.random.default_rng(seed)
+    layouts = {
+        "uniform": rng.uniform(0, 100, (num_points, 2)),
+        "clustered": rng.normal(50, 2, (num_points, 2))
+        + (np.arange(num_points) % 2)[:, None] * 40,
+        "collinear": np.c_[rng.uniform(0, 1000, num_points), np.full(num_points, 5.0)],
+        "integer": rng.integers(0, 101, (num_points, 2)).astype(np.float64),
+    }
+    queries = rng.uniform(-300, 400, (num_queries, 2))
+    for points in layouts.values():
+        found = GridIndex(np.arange(num_points), points).nearest_many(queries)
+        expected = nearest_brute_force(points, queries)
+        if not np.allclose(
+            np.hypot(*(points[found] - queries).T),
+            np.hypot(*(points[expected] - queries).T),
+        ):
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    for num_points in (1, 2, 7, 64, 500, 3000):
+        result = "ok" if check_against_brute_force(num_points) else "MISMATCH"
+        print(f"{num_points} points: {result}")
@@ -1,11 +1,16 @@
 import math
-from typing import Dict, Union
+from typing import Dict, List, Tuple
 
+import numpy as np
+from drone import Drone
 from package_station import PackageStation
+from position import Position
+from spatial_index import GridIndex, nearest_brute_force
 
 
 def generate_distance_lut(
     stations: Dict[int, PackageStation],
+    origin: Tuple[float, float] = (0, 0),
 ) -> Dict[int, Dict[int, float]]:
     """
     Compute a distance lookup table for each station in 'stations'.
@@ -13,40 +18,90 @@ def generate_distance_lut(
 
         {
             station_id_A: {
-                0: <distance from (0,0) to station A>,
-                station_id_B: <distance between station A and station B>,
-                station_id_C: <distance between station A and station C>,
-                ...
+                0: <distance from the sorting office at 'origin' to station A>,
             },
             station_id_B: {
-                0: <distance from (0,0) to station B>,
-                station_id_A: <distance between station B and station A>,
-                ...
+                0: <distance from the sorting office at 'origin' to station B>,
             }
             ...
         }
+
+    Drones only fly between their sorting office and a station, so the
+    station-to-station distances are not computed.
     """
-    distance_lut: Dict[int, Dict[Union[int, str], float]] = {}
+    distance_lut: Dict[int, Dict[int, float]] = {}
 
     for station_id, station in stations.items():
         x, y = station.get_position()
-        dist_from_centre = math.dist((0, 0), (x, y))
+        dist_from_centre = math.dist(origin, (x, y))
 
         distance_lut[station_id] = {0: dist_from_centre}
 
-    station_ids = list(stations.keys())
+    return distance_lut
 
-    for i in range(len(station_ids)):
-        for j in range(i + 1, len(station_ids)):
-            id_a = station_ids[i]
-            id_b = station_ids[j]
 
-            x_a, y_a = stations[id_a].get_position()
-            x_b, y_b = stations[id_b].get_position()
+# Above this many offices the grid index beats the brute-force scan: with
+# 1M stations over the offices' area, 2.0 s against 1.8 s at 64 offices,
+# 2.7 s against 4.4 s at 128 and 2.2 s against 60 s at 2000
+MAX_OFFICES_BRUTE_FORCE = 100
 
-            dist_ab = math.dist((x_a, y_a), (x_b, y_b))
 
-            distance_lut[id_a][id_b] = dist_ab
-            distance_lut[id_b][id_a] = dist_ab
+def _nearest_offices(
+    offices: List[dict], points: List[Tuple[float, float]]
+) -> List[int]:
+    """Return the id of the office closest to each point."""
+    office_ids = [o["id"] for o in offices]
+    if len(offices) == 1 or not points:
+        return office_ids[:1] * len(points)
 
-    return distance_lut
+    if len(offices) > MAX_OFFICES_BRUTE_FORCE:
+        index = GridIndex(office_ids, [tuple(o["position"]) for o in offices])
+        return index.nearest_many(points).tolist()
+
+    office_positions = np.array([o["position"] for o in offices], dtype=np.float64)
+    nearest = nearest_brute_force(
+        office_positions, np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    )
+    return np.asarray(office_ids)[nearest].tolist()
+
+
+def assign_to_sorting_offices(
+    config: dict, drones: Dict[int, Drone], stations: Dict[int, PackageStation]
+) -> Dict[int, Tuple[Position, Dict[int, Drone], Dict[int, PackageStation]]]:
+    """
+    Split drones and stations between the sorting offices of the config.
+
+    Each entry of 'sorting_offices' has an id, a position and optionally the
+    ids of its drones; drones not listed anywhere are shared out round-robin.
+    Every station is served by its nearest office. Without 'sorting_offices'
+    there is a single office (ID = 0) at (0, 0) with all drones and stations.
+    """
+    offices = config.get("sorting_offices") or [{"id": 0, "position": [0, 0]}]
+
+    office_drones: Dict[int, Dict[int, Drone]] = {o["id"]: {} for o in offices}
+    assigned = set()
+    for o in offices:
+        for drone_id in o.get("drones", []):
+            office_drones[o["id"]][drone_id] = drones[drone_id]
+            assigned.add(drone_id)
+    unassigned = [drone_id for drone_id in drones if drone_id not in assigned]
+    for i, drone_id in enumerate(unassigned):
+        office_id = offices[i % len(offices)]["id"]
+        office_drones[office_id][drone_id] = drones[drone_id]
+
+    office_stations: Dict[int, Dict[int, PackageStation]] = {
+        o["id"]: {} for o in offices
+    }
+    nearest = _nearest_offices(
+        offices, [station.get_position() for station in stations.values()]
+    )
+    for (station_id, station), office_id in zip(stations.items(), nearest):
+        office_stations[office_id][station_id] = station
+
+    result = {}
+    for o in offices:
+        if not office_drones[o["id"]]:
+            raise ValueError(f"Sorting office {o['id']} has no drones")
+        position = Position(tuple(o["position"])[0], tuple(o["position"])[1])
+        result[o["id"]] = (position, office_drones[o["id"]], office_stations[o["id"]])
+    return result
@@ -1,10 +1,12 @@
 from __future__ import annotations
-import yaml
 import csv
 import typer
 from collections import defaultdict
 from pathlib import Path
+from config_loader import load_config
+from event_bus import EventBus, SimulationEventTypes
 from position import Position
+from utils import assign_to_sorting_offices
 import pygame
 from typing import List
 from visualiztion_objects import *
@@ -49,44 +51,93 @@ class Action:
 
 
 class Controller:
+    """
+    Replays a delivery log. Dispatches, deliveries and collections are kept
+    as three separately time-sorted sequences, since the log is in neither
+    delivery nor collection order (and rows are written at delivery time).
+    """
+
     def __init__(
         self, drones: dict[Drone], stations: dict[PackageStation], actions: List[Action]
     ):
         self._drones = drones
         self._stations = stations
-        self._actions = actions
+        self._dispatches = sorted(actions, key=lambda a: a._dispatch_time)
+        self._deliveries = sorted(actions, key=lambda a: a._delivery_time)
+        # Packages never collected (expired) have no collection
+        self._collections = sorted(
+            (a for a in actions if a._collection_time != float("inf")),
+            key=lambda a: a._collection_time,
+        )
         self._drone_action = 0
         self._delivery_action = 0
         self._collection_action = 0
 
     def simulate(self, current_time: float, delta_time: float):
-        if self._actions[self._drone_action]._dispatch_time <= current_time:
-            self._drones[self._actions[self._drone_action]._drone_id].set_destination(
-                self._stations[
-                    self._actions[self._drone_action]._station_id
-                ].get_position()[0],
-                self._stations[
-                    self._actions[self._drone_action]._station_id
-                ].get_position()[1],
-            )
+        while (
+            self._drone_action < len(self._dispatches)
+            and self._dispatches[self._drone_action]._dispatch_time <= current_time
+        ):
+            action = self._dispatches[self._drone_action]
+            position = self._stations[action._station_id].get_position()
+            self._drones[action._drone_id].set_destination(position[0], position[1])
             self._drone_action += 1
-        if self._actions[self._delivery_action]._delivery_time <= current_time:
-            self._stations[self._actions[self._delivery_action]._station_id].update(
+        while (
+            self._delivery_action < len(self._deliveries)
+            and self._deliveries[self._delivery_action]._delivery_time <= current_time
+        ):
+            self._stations[self._deliveries[self._delivery_action]._station_id].update(
                 PackageStationVisualizer.INCREASE
             )
             self._delivery_action += 1
-        if self._actions[self._collection_action]._collection_time == float("inf"):
-            self._collection_action += 1
-        if self._actions[self._collection_action]._collection_time <= current_time:
-            self._stations[self._actions[self._collection_action]._station_id].update(
-                PackageStationVisualizer.DECREASE
-            )
+        while (
+            self._collection_action < len(self._collections)
+            and self._collections[self._collection_action]._collection_time
+            <= current_time
+        ):
+            self._stations[
+                self._collections[self._collection_action]._station_id
+            ].update(PackageStationVisualizer.DECREASE)
             self._collection_action += 1
 
 
-def load_config_yaml(filepath: str) -> dict:
-    with open(filepath, "r") as f:
-        return yaml.safe_load(f)
+class LiveController:
+    """
+    Applies events published by a running SortingOffice on an EventBus.
+    Events are published when they happen in simulation time, so each
+    frame only has to drain the bus and apply what arrived.
+    """
+
+    def __init__(
+        self,
+        drones: dict[Drone],
+        stations: dict[PackageStation],
+        event_bus: EventBus,
+    ):
+        self._drones = drones
+        self._stations = stations
+        self._event_bus = event_bus
+        self._max_latency = 0.0
+
+    def simulate(self, current_time: float, delta_time: float):
+        for event in self._event_bus.drain():
+            self._max_latency = max(self._max_latency, event.get_latency())
+            station = self._stations[event.get_station_id()]
+            if event.get_event_type() == SimulationEventTypes.DISPATCH:
+                self._drones[event.get_drone_id()].set_destination(
+                    station.get_position()[0], station.get_position()[1]
+                )
+            elif event.get_event_type() == SimulationEventTypes.DELIVERY:
+                station.update(PackageStationVisualizer.INCREASE)
+            elif event.get_event_type() in (
+                SimulationEventTypes.COLLECTION,
+                SimulationEventTypes.EXPIRATION,
+            ):
+                station.update(PackageStationVisualizer.DECREASE)
+
+    def get_max_latency(self) -> float:
+        """Largest wall-clock delay between publishing and applying an event."""
+        return self._max_latency
 
 
 def load_simulation_csv(filepath: str):
@@ -99,22 +150,8 @@ def load_simulation_csv(filepath: str):
     return dict(csv_data)
 
 
-app = typer.Typer()
-
-
-@app.command()
-def run(
-    config_file_yaml: Path = typer.Argument(..., help="Path to the YAML config file."),
-    simulation_file_csv: Path = typer.Argument(
-        ..., help="Path to the simulation CSV file."
-    ),
-    speed_factor: int = typer.Option(1, help="Visualization Speed factor"),
-    map_size_factor: int = typer.Option(5, help="Map size factor"),
-):
-
-    config = load_config_yaml(config_file_yaml)
-    simulation = load_simulation_csv(simulation_file_csv)
-
+def build_scene(config: dict, speed_factor: float, map_size_factor: int):
+    """Create drone, station and sorting office visualizers scaled for the screen."""
     drones = {}
     for d in config.get("drones", []):
         drone_id = d["id"]
@@ -131,14 +168,39 @@ def run(
         lockers = s["lockers"]
         stations[station_id] = PackageStationVisualizer(station_id, position, lockers)
 
-    sorting_office = SortingOfficeVisualizer()
-
+    # Drones start from and return to the sorting office serving them
+    offices = [
+        {**o, "position": [c * map_size_factor for c in o["position"]]}
+        for o in config.get("sorting_offices", [])
+    ]
+    assignment = assign_to_sorting_offices(
+        {"sorting_offices": offices}, drones, stations
+    )
+    sorting_offices = []
+    for position, office_drones, _ in assignment.values():
+        sorting_offices.append(SortingOfficeVisualizer(position))
+        for drone in office_drones.values():
+            drone.set_home(position)
+
+    return drones, stations, sorting_offices
+
+
+def run_loop(
+    drones: dict[DroneVisualizer],
+    stations: dict[PackageStationVisualizer],
+    sorting_offices: List[SortingOfficeVisualizer],
+    controller,
+    speed_factor: float,
+) -> None:
+    """Run the pygame loop, feeding the controller until the window is closed."""
     pygame.init()
 
     screen_x, screen_y = 0, 0
 
-    screen_x = max(station.get_position()[0] for station in stations.values()) + 100
-    screen_y = max(station.get_position()[1] for station in stations.values()) + 100
+    positions = [station.get_position() for station in stations.values()]
+    positions += [sorting_office.get_position() for sorting_office in sorting_offices]
+    screen_x = max(position[0] for position in positions) + 100
+    screen_y = max(position[1] for position in positions) + 100
 
     screen = pygame.display.set_mode((screen_x, screen_y))
     pygame.display.set_caption("Air Post")
@@ -146,9 +208,6 @@ def run(
 
     start_time = pygame.time.get_ticks()
 
-    actions = Action.get_actions(simulation)
-
-    controller = Controller(drones, stations, actions)
     while True:
 
         current_time = (pygame.time.get_ticks() - start_time) / 1000.0 * speed_factor
@@ -163,8 +222,9 @@ def run(
                 pygame.quit()
                 return
 
-        sorting_office.draw(screen)
-        sorting_office.update()
+        for sorting_office in sorting_offices:
+            sorting_office.draw(screen)
+            sorting_office.update()
         controller.simulate(current_time, delta_time)
         for station in stations.values():
             station.draw(screen)
@@ -176,6 +236,32 @@ def run(
         pygame.display.flip()
 
 
+app = typer.Typer()
+
+
+@app.command()
+def run(
+    config_file_yaml: Path = typer.Argument(..., help="Path to the YAML or NPZ config file."),
+    simulation_file_csv: Path = typer.Argument(
+        ..., help="Path to the simulation CSV file."
+    ),
+    speed_factor: int = typer.Option(1, help="Visualization Speed factor"),
+    map_size_factor: int = typer.Option(5, help="Map size factor"),
+):
+
+    config = load_config(config_file_yaml)
+    simulation = load_simulation_csv(simulation_file_csv)
+
+    drones, stations, sorting_offices = build_scene(
+        config, speed_factor, map_size_factor
+    )
+
+    actions = Action.get_actions(simulation)
+
+    controller = Controller(drones, stations, actions)
+    run_loop(drones, stations, sorting_offices, controller, speed_factor)
+
+
 def main():
     app()
 
@@ -5,9 +5,10 @@ from drone import Drone
 from package_station import PackageStation
 class DroneVisualizer(Drone):
 
-    def __init__(self, drone_id: int, velocity: float):
+    def __init__(self, drone_id: int, velocity: float, home: Position = Position(0, 0)):
         super().__init__(drone_id, velocity)
-        self._position = Position(0, 0)
+        self._home = home
+        self._position = Position(*home.get_position())
         self._image = pygame.image.load("drone.png")
         self._destination = None
         self._start_time = 0
@@ -22,6 +23,10 @@ class DroneVisualizer(Drone):
     def set_destination(self, x: int, y: int):
         self._destination = Position(x, y)
 
+    def set_home(self, home: Position):
+        self._home = home
+        self._position = Position(*home.get_position())
+
     def get_start_time(self):
         return self._start_time
     
@@ -63,7 +68,7 @@ class DroneVisualizer(Drone):
         if distance_to_destination < epsilon:
             # Jeśli dystans jest mniejszy niż epsilon, uznaj, że dron dotarł do celu
             self._position = Position(dest_x, dest_y)
-            self._destination = Position(0, 0)
+            self._destination = Position(*self._home.get_position())
             return
 
         # Normalizacja wektora kierunku